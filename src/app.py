@@ -7,7 +7,7 @@ from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from transformers import logging as transformers_logging
 
-from src.dependencies.faiss import FAISS_Wrapper
+from src.dependencies.faiss import FAISS_Wrapper, pin_snapshot
 
 from .dependencies.auth import developer_role, get_role
 from .dependencies.strapi import Strapi
@@ -51,10 +51,11 @@ async def lifespan(app: FastAPI):
         os.environ["VECTOR_KEY"],
     )
     app.state.faiss = FAISS_Wrapper(app.state.supabase)
-    await app.state.faiss.create_faiss_index()
+    await app.state.faiss.load()
     try:
         yield
     finally:
+        await app.state.faiss.close()
         await app.state.strapi.client.aclose()
 
 
@@ -91,9 +92,13 @@ def hello() -> Message:
     return Message(message="This is a summary scoring API for iTELL.")
 
 
-app.include_router(score.router, dependencies=[Depends(get_role)])
-app.include_router(chat.router, dependencies=[Depends(get_role)])
-app.include_router(generate.router, dependencies=[Depends(developer_role)])
+app.include_router(
+    score.router, dependencies=[Depends(get_role), Depends(pin_snapshot)]
+)
+app.include_router(chat.router, dependencies=[Depends(get_role), Depends(pin_snapshot)])
+app.include_router(
+    generate.router, dependencies=[Depends(developer_role), Depends(pin_snapshot)]
+)
 app.include_router(admin.router, dependencies=[Depends(developer_role)])
 
 
@@ -1,147 +1,1159 @@
+import asyncio
+import json
 import logging
-from typing import List
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncGenerator, Iterator, List, Optional
 
 import faiss
 import numpy as np
+from cachetools import LRUCache
+from fastapi import Request
 from sentry_sdk import capture_message
 
 from ..pipelines.embed import EmbeddingPipeline
-from ..schemas.embedding import RetrievalInput, RetrievalResults, RetrievalStrategy
+from ..utils.chunk_metadata import ChunkMetadata
+from ..schemas.embedding import (
+    DeleteUnusedInput,
+    IndexBackend,
+    IndexBackendReport,
+    IndexJob,
+    IndexJobKind,
+    IndexJobStatus,
+    RetrievalInput,
+    RetrievalResults,
+    RetrievalStrategy,
+)
 from .supabase import SupabaseClient
 
 logger = logging.getLogger("itell_ai")
 
 
+@dataclass
+class PagePartition:
+    """Contiguous copy of the vectors of a single page.
+
+    The centroid is the (unnormalized) mean of the page's vectors. Because
+    the vectors are L2-normalized, the dot product of a normalized query
+    with the centroid equals the mean cosine similarity to the page's chunks.
+    """
+
+    ids: np.ndarray  # int64 chunk IDs, in the same order as vectors
+    vectors: np.ndarray  # (n, dim) float32, L2-normalized
+    centroid: np.ndarray  # (dim,) float32
+
+
+@dataclass
+class SearchIndex:
+    """Search index of a backend, updated with the chunks changed by each
+    write instead of being rebuilt.
+
+    Rows are only appended, never removed, since HNSW and GPU flat indexes
+    do not support removal. Versions share the index, the chunk ID of each
+    row (labels) and the row of each chunk ID (rows_of), and each keeps its
+    own row count and tombstones: rows of chunks removed or replaced since
+    the build. Rows appended past a version's count belong to newer
+    versions. Searches ask for extra results to make up for the rows a
+    version cannot see, and drop them.
+
+    Appends and searches are serialized by lock, since neither FAISS
+    indexes nor GPU resources can be used from two threads at once.
+    """
+
+    index: faiss.Index  # Rows are numbered in the order they were added
+    labels: np.ndarray  # int64 chunk ID of each row, -1 for none. Grown in place
+    rows_of: dict[int, int]  # Chunk ID -> its row. Chunk IDs are never reused
+    n_rows: int  # Rows of this version
+    built_rows: int  # Rows when the index was built
+    tombstones: np.ndarray = field(default_factory=lambda: np.empty(0, np.int64))
+    drift: int = 0  # Rows added or tombstoned since the build
+    read_only: bool = False  # Memory-mapped, so it has to be rebuilt to update
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    max_k = 2048  # Largest k supported by GPU indexes
+
+    @classmethod
+    def build(
+        cls, index: faiss.Index, ids: np.ndarray, lock: Optional[threading.Lock] = None
+    ) -> "SearchIndex":
+        """Wraps an index whose rows hold the chunks with the given IDs."""
+        return cls(
+            index=index,
+            labels=ids.astype(np.int64),
+            rows_of={chunk_id: row for row, chunk_id in enumerate(ids.tolist())},
+            n_rows=len(ids),
+            built_rows=len(ids),
+            lock=lock or threading.Lock(),
+        )
+
+    def updated(
+        self, removed_ids: set[int], ids: np.ndarray, vectors: np.ndarray
+    ) -> "SearchIndex":
+        """The next version: the rows of removed chunks become tombstones
+        and the vectors of added chunks are appended. Readers of this
+        version are not affected. Costs O(changed chunks)."""
+        dead = [self.rows_of[i] for i in removed_ids if i in self.rows_of]
+        with self.lock:
+            start = self.index.ntotal
+            if len(ids):
+                self.index.add(vectors)
+        end = start + len(ids)
+
+        labels = self.labels
+        if end > len(labels):
+            labels = np.resize(labels, max(end, 2 * len(labels)))
+        # Rows appended by an unpublished version are tombstones here
+        labels[self.n_rows : start] = -1
+        labels[start:end] = ids
+        self.rows_of.update(zip(ids.tolist(), range(start, end)))
+
+        tombstones = np.union1d(
+            self.tombstones,
+            np.concatenate([dead, np.arange(self.n_rows, start)]).astype(np.int64),
+        )
+        return replace(
+            self,
+            labels=labels,
+            n_rows=end,
+            tombstones=tombstones,
+            drift=self.drift + len(dead) + len(ids),
+        )
+
+    def drifted(self, max_drift: float, max_tombstones: int) -> bool:
+        """Whether the index should be rebuilt from the page partitions."""
+        return (
+            self.drift > max_drift * max(self.built_rows, 1)
+            or len(self.tombstones) > max_tombstones
+        )
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Same as faiss.Index.search, with chunk IDs as labels."""
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        with self.lock:
+            ntotal = self.index.ntotal
+            extra = len(self.tombstones) + ntotal - self.n_rows
+            k_all = min(k + extra, ntotal, self.max_k)
+            if k_all <= 0:
+                return similarities, ids
+            found_similarities, rows = self.index.search(queries, k_all)
+
+        live = (rows >= 0) & (rows < self.n_rows) & ~np.isin(rows, self.tombstones)
+        labels = np.where(live, self.labels[np.where(live, rows, 0)], -1)
+        # The first k live results of each query, in rank order
+        order = np.argsort(labels == -1, axis=1, kind="stable")[:, :k]
+        width = order.shape[1]
+        ids[:, :width] = np.take_along_axis(labels, order, axis=1)
+        similarities[:, :width] = np.take_along_axis(found_similarities, order, axis=1)
+        similarities[ids == -1] = -np.inf
+        return similarities, ids
+
+
+@dataclass
+class IndexSnapshot:
+    """A complete version of the index: metadata, page partitions and the
+    search index.
+
+    The page partitions hold every vector and are the source of truth.
+    Writers build the next snapshot from a copy and publish it by replacing
+    FAISS_Wrapper.snapshot, a single reference assignment. A copy shares
+    everything a write does not touch: the partitions of other pages, the
+    rows of the metadata store (see ChunkMetadata) and the search index
+    (see SearchIndex), so a write costs O(changed chunks and their pages).
+    Readers take one reference and use it for the whole request, so an
+    index is never paired with metadata from another version.
+    """
+
+    metadata: ChunkMetadata
+    pages: dict[str, PagePartition] = field(default_factory=dict)
+    search_index: Optional[SearchIndex] = None
+    watermark: Optional[str] = None  # Latest updated_at in the index
+    version: int = 0
+    # Changes of an unpublished snapshot, applied by FAISS_Wrapper._publish
+    dirty_pages: set[str] = field(default_factory=set)
+    added_ids: list[np.ndarray] = field(default_factory=list)
+    added_vectors: list[np.ndarray] = field(default_factory=list)
+    removed_ids: set[int] = field(default_factory=set)
+
+
 class FAISS_Wrapper:
-    def __init__(self, supabase: SupabaseClient) -> None:
+    """In-memory copy of the Supabase vector store.
+
+    Vectors are kept in per-page partitions, which are the source of truth,
+    so that a write only rebuilds the partitions of the pages it touches.
+    Each version of a chunk is assigned an integer ID that is used as the
+    FAISS ID and as the row of the columnar metadata store.
+
+    Searches go through a search index built from the partitions for the
+    configured backend (FAISS_BACKEND environment variable), which writes
+    update incrementally.
+
+    Queries scoped to pages use per-page partitions instead of the search
+    index: an exact dot product over only those pages' vectors. This is
+    O(page size) and never misses a chunk that falls outside a global top k.
+
+    Writes are submitted as jobs and applied by a background worker, which
+    builds a new IndexSnapshot and publishes it in one swap. Jobs queued
+    while the worker is busy are applied together to a single snapshot.
+
+    If FAISS_SNAPSHOT_DIR is set, the index is saved to disk after a full
+    rebuild and loaded from there at startup (see load). Snapshots require
+    an `updated_at` column on the embeddings table, used as a watermark to
+    sync only the rows that changed since the snapshot was written.
+    """
+
+    dim = 384
+    metadata_columns = ["chunk", "text", "chapter", "module", "page", "content"]
+    page_size = 1000  # PostgREST returns at most 1000 rows per request
+    watermark_column = "updated_at"
+    snapshot_format = 5  # Increment when the snapshot layout changes
+    sync_timeout = 30.0  # Seconds to wait for Supabase before serving a snapshot
+    sync_overlap = 60.0  # Seconds before the watermark that sync reads again
+    max_jobs = 1000  # Finished jobs kept for status lookups
+
+    # Approximate index parameters
+    hnsw_m = 32
+    hnsw_ef_search = 128
+    ivf_nprobe = 8
+    # Rebuild (and retrain) a search index once the rows added or tombstoned
+    # since its build exceed this fraction of it, or tombstones exceed max
+    max_drift = 0.2
+    max_tombstones = 512
+
+    def __init__(
+        self,
+        supabase: SupabaseClient,
+        backend: IndexBackend | None = None,
+        snapshot_dir: str | None = None,
+    ) -> None:
         self.supabase = supabase
-        self.index = None
-        self.metadata = []
-        self.pipeline = EmbeddingPipeline()
+        self.backend = IndexBackend(
+            backend or os.getenv("FAISS_BACKEND", IndexBackend.gpu_flat)
+        )
+        snapshot_dir = snapshot_dir or os.getenv("FAISS_SNAPSHOT_DIR")
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.snapshot = self._empty_snapshot()  # The published snapshot
+        self._pinned: ContextVar[IndexSnapshot | None] = ContextVar(
+            f"faiss_snapshot_{id(self)}", default=None
+        )
+        self.jobs: LRUCache[str, IndexJob] = LRUCache(maxsize=self.max_jobs)
+        self._queue: asyncio.Queue[tuple[IndexJob, object]] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+        self._gpu_resources = None
+        # Shared by the search indexes of every version, see SearchIndex
+        self._index_lock = threading.Lock()
 
-    def embed_query(self, text: str) -> List[float]:
+    async def embed_query(self, text: str) -> List[float]:
         """Embed query text."""
-        return self.pipeline(text).tolist()[0]
+        pipeline = await EmbeddingPipeline.ashared()
+        return (await pipeline.aembed([text]))[0].tolist()
 
-    async def create_faiss_index(self) -> None:
-        """Creates a FAISS index for the vector store."""
-        response = await self.supabase.table("embeddings").select("*").execute()
-        vector_data = response.data
-        dim = 384
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        """Embed query texts into a normalized (n, dim) float32 matrix.
+        Texts already in the embedding cache are not embedded again, and the
+        rest are batched with concurrent requests by the pipeline."""
+        pipeline = await EmbeddingPipeline.ashared()
+        return await pipeline.aembed(texts)
 
-        embeddings = np.array([[0] * dim])
-        metadata = np.array(
-            [
-                {
-                    "chunk": "",
-                    "text": "",
-                    "chapter": "",
-                    "module": "",
-                    "page": "",
-                    "context": "",
-                }
-            ]
+    def _empty_snapshot(self) -> IndexSnapshot:
+        return IndexSnapshot(metadata=ChunkMetadata())
+
+    def _copy(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        """An unpublished copy of a snapshot for writers to modify.
+        Page partitions, metadata rows and the search index are shared, and
+        writes replace or append to them rather than modifying them."""
+        return IndexSnapshot(
+            metadata=snapshot.metadata.copy(),
+            pages=dict(snapshot.pages),
+            search_index=snapshot.search_index,
+            watermark=snapshot.watermark,
         )
 
-        vector_data = filter(lambda x: x["embedding"] is not None, vector_data)
+    @contextmanager
+    def pinned(self) -> Iterator[IndexSnapshot]:
+        """Pins the published snapshot in the current context (request),
+        so that every search made in it sees one version."""
+        snapshot = self.snapshot
+        token = self._pinned.set(snapshot)
+        try:
+            yield snapshot
+        finally:
+            self._pinned.reset(token)
 
-        for data in vector_data:
-            data_info = {
-                "chunk": data["chunk"],
-                "text": data["text"],
-                "chapter": data["chapter"],
-                "module": data["module"],
-                "page": data["page"],
-                "context": data["content"],
-            }
-            metadata = np.append(metadata, data_info)
-            embedding = data["embedding"].replace("[", "").replace("]", "").split(",")
-            if len(embedding) != dim:
-                logger.info(
-                    f"Skipping {data['chunk']} due to incorrect embedding length"
+    def _current(self) -> IndexSnapshot:
+        """The snapshot pinned by the current request, else the published one."""
+        snapshot = self._pinned.get()
+        return self.snapshot if snapshot is None else snapshot
+
+    @property
+    def gpu_resources(self):
+        """Created on first use so that CPU-only nodes never touch CUDA."""
+        if self._gpu_resources is None:
+            self._gpu_resources = faiss.StandardGpuResources()  # use a single GPU
+        return self._gpu_resources
+
+    def _vectors(self, snapshot: IndexSnapshot) -> tuple[np.ndarray, np.ndarray]:
+        """IDs and vectors of every chunk, concatenated from the partitions."""
+        partitions = snapshot.pages.values()
+        ids = np.concatenate(
+            [np.empty(0, dtype=np.int64)] + [part.ids for part in partitions]
+        )
+        vectors = np.concatenate(
+            [np.empty((0, self.dim), dtype=np.float32)]
+            + [part.vectors for part in partitions]
+        )
+        return ids, vectors
+
+    def _build_search_index(
+        self, ids: np.ndarray, vectors: np.ndarray, backend: IndexBackend
+    ) -> SearchIndex:
+        """Build a search index for the backend over the given chunks.
+        A gpu_flat index is built on the CPU, and moved to a GPU with _to_gpu."""
+        ntotal = len(ids)
+        if backend in (IndexBackend.cpu_flat, IndexBackend.gpu_flat) or ntotal == 0:
+            index = faiss.IndexFlatIP(self.dim)
+        elif backend == IndexBackend.cpu_hnsw:
+            index = faiss.IndexHNSWFlat(
+                self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efSearch = self.hnsw_ef_search
+        elif backend == IndexBackend.cpu_ivf:
+            nlist = max(1, int(np.sqrt(ntotal)))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFFlat(
+                quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vectors)
+            index.nprobe = min(self.ivf_nprobe, nlist)
+        else:
+            raise ValueError(f"Unknown index backend: {backend}")
+
+        index.add(vectors)
+        return SearchIndex.build(index, ids, self._index_lock)
+
+    def _to_gpu(self, search_index: SearchIndex, resources=None) -> SearchIndex:
+        resources = resources or self.gpu_resources
+        with search_index.lock:
+            search_index.index = faiss.index_cpu_to_gpu(
+                resources, 0, search_index.index
+            )
+        return search_index
+
+    def _added(self, snapshot: IndexSnapshot) -> tuple[np.ndarray, np.ndarray]:
+        """IDs, in ascending order, and vectors of the chunks added by a
+        write, without those it replaced or removed again."""
+        ids = np.concatenate([np.empty(0, dtype=np.int64)] + snapshot.added_ids)
+        vectors = np.concatenate(
+            [np.empty((0, self.dim), dtype=np.float32)] + snapshot.added_vectors
+        )
+        live = ~np.isin(ids, list(snapshot.removed_ids))
+        return ids[live], vectors[live]
+
+    def _refresh_pages(
+        self, snapshot: IndexSnapshot, added_ids: np.ndarray, added: np.ndarray
+    ) -> None:
+        """Rebuild the page partitions touched by a write. Vectors are taken
+        from the chunks added by the write, else from the page's previous
+        partition. IDs are in ascending order in both."""
+        for page_slug in snapshot.dirty_pages:
+            ids = snapshot.metadata.ids_on_page(page_slug)
+            if len(ids) == 0:
+                snapshot.pages.pop(page_slug, None)
+                continue
+            vectors = np.empty((len(ids), self.dim), dtype=np.float32)
+            sources = [(added_ids, added)]
+            previous = snapshot.pages.get(page_slug)
+            if previous is not None:
+                sources.append((previous.ids, previous.vectors))
+            for source_ids, source_vectors in sources:
+                rows = np.searchsorted(source_ids, ids)
+                found = rows < len(source_ids)
+                found[found] = source_ids[rows[found]] == ids[found]
+                vectors[found] = source_vectors[rows[found]]
+            snapshot.pages[page_slug] = PagePartition(
+                ids=ids, vectors=vectors, centroid=vectors.mean(axis=0)
+            )
+
+    def _apply(self, snapshot: IndexSnapshot) -> None:
+        """Apply a write to the page partitions and the search index.
+
+        The search index is updated with the chunks the write changed, and
+        only rebuilt from the partitions once it drifts too far (see
+        SearchIndex), or if it is memory-mapped. A rebuilt gpu_flat index is
+        uploaded here, under the index lock.
+        """
+        added_ids, added = self._added(snapshot)
+        self._refresh_pages(snapshot, added_ids, added)
+
+        search_index = snapshot.search_index
+        changed = len(added_ids) or snapshot.removed_ids
+        if search_index is not None and changed:
+            if search_index.read_only:
+                search_index = None
+            else:
+                search_index = search_index.updated(
+                    snapshot.removed_ids, added_ids, added
                 )
+        if search_index is None or search_index.drifted(
+            self.max_drift, self.max_tombstones
+        ):
+            search_index = self._build_search_index(
+                *self._vectors(snapshot), self.backend
+            )
+            if self.backend == IndexBackend.gpu_flat:
+                self._to_gpu(search_index)
+
+        snapshot.search_index = search_index
+        snapshot.dirty_pages = set()
+        snapshot.added_ids = []
+        snapshot.added_vectors = []
+        snapshot.removed_ids = set()
+
+    async def _publish(self, snapshot: IndexSnapshot) -> None:
+        """Finish an unpublished snapshot in a thread and swap it in."""
+        await asyncio.to_thread(self._apply, snapshot)
+        snapshot.version = self.snapshot.version + 1
+        self.snapshot = snapshot
+
+    def _parse_rows(
+        self, rows: list[dict], out: np.ndarray | None = None
+    ) -> tuple[list[dict], np.ndarray, list[str]]:
+        """Parse Supabase rows into metadata and a normalized float32 matrix.
+
+        pgvector returns embeddings as "[x,y,...]" strings. All valid vectors
+        are joined and parsed with a single np.fromstring call, written into
+        `out` if provided. Rows without an embedding or with the wrong
+        dimension are skipped and their slugs returned.
+        """
+        metadata = []
+        strings = []
+        skipped = []
+        for row in rows:
+            embedding = row["embedding"]
+            if embedding is None:
+                continue
+            if embedding.count(",") + 1 != self.dim:
+                skipped.append(row["chunk"])
                 continue
-            arr = np.asarray(embedding, dtype=np.float32)
-            embeddings = np.append(embeddings, [arr], axis=0)
+            strings.append(embedding.strip("[]"))
+            metadata.append({column: row[column] for column in self.metadata_columns})
+
+        if out is None:
+            out = np.empty((len(strings), self.dim), dtype=np.float32)
+        embeddings = out[: len(strings)]
+        if strings:
+            embeddings[:] = np.fromstring(
+                ",".join(strings), dtype=np.float32, sep=","
+            ).reshape(len(strings), self.dim)
+            faiss.normalize_L2(embeddings)
+
+        return metadata, embeddings, skipped
+
+    @property
+    def _columns(self) -> list[str]:
+        """Columns fetched for indexing."""
+        columns = [*self.metadata_columns, "embedding"]
+        if self.snapshot_dir:
+            columns.append(self.watermark_column)
+        return columns
 
-        res = faiss.StandardGpuResources()  # use a single GPU
-        index = faiss.index_factory(dim, "Flat", faiss.METRIC_INNER_PRODUCT)
-        gpu_index_flat = faiss.index_cpu_to_gpu(res, 0, index)
+    def _max_watermark(self, rows: list[dict], watermark: str | None) -> str | None:
+        if not self.snapshot_dir:
+            return None
+        values = [row[self.watermark_column] for row in rows]
+        return max(filter(None, [watermark, *values]), default=None)
+
+    async def _fetch_pages(
+        self, columns: list[str] | None = None, since: str | None = None
+    ) -> AsyncGenerator[tuple[list[dict], int | None], None]:
+        """Yields the embeddings table one page at a time in chunk order, along
+        with the total row count. The count is only requested with the first
+        page, and None is yielded with the others.
+        Pages are read by keyset on the chunk slug rather than by offset, so
+        each page costs the same however deep into the table it is.
+        If since is given, only rows updated at or after it are returned."""
+        columns = columns or self._columns
+        if "chunk" not in columns:
+            columns = [*columns, "chunk"]  # The keyset
+        last = None
+        while True:
+            query = self.supabase.table("embeddings").select(
+                *columns, count="exact" if last is None else None
+            )
+            if since is not None:
+                query = query.gte(self.watermark_column, since)
+            if last is not None:
+                query = query.gt("chunk", last)
+            response = await query.order("chunk").limit(self.page_size).execute()
+            yield response.data, response.count
+            if len(response.data) < self.page_size:
+                break
+            last = response.data[-1]["chunk"]
+
+    def _add(
+        self, snapshot: IndexSnapshot, metadata: list[dict], embeddings: np.ndarray
+    ) -> None:
+        """Add parsed rows to the index, replacing any rows with the same slug."""
+        ids = []
+        for data in metadata:
+            previous_id = snapshot.metadata.id_of(data["chunk"])
+            if previous_id is not None:
+                snapshot.dirty_pages.add(snapshot.metadata.page(previous_id))
+                snapshot.removed_ids.add(previous_id)
+            ids.append(snapshot.metadata.add(data))
+            snapshot.dirty_pages.add(data["page"])
+
+        if not ids:
+            return
+
+        snapshot.added_ids.append(np.asarray(ids, dtype=np.int64))
+        snapshot.added_vectors.append(embeddings)
+
+    async def create_faiss_index(self) -> None:
+        """Rebuilds the FAISS index from the full vector store.
+        Intended for startup. Use submit_rebuild to rebuild a running index
+        in the background, and submit_upsert or submit_remove_unused to keep
+        it in sync after individual writes.
+
+        Rows are fetched in pages and parsed directly into a preallocated
+        matrix, so build time and peak memory grow linearly with the corpus.
+        """
+        embeddings = None
+        metadata = []
+        skipped = []
+        watermark = None
+        logger.info("Fetching embeddings...")
+        async for rows, total in self._fetch_pages():
+            watermark = self._max_watermark(rows, watermark)
+            if embeddings is None:
+                embeddings = np.empty((total or 0, self.dim), dtype=np.float32)
+            n = len(metadata)
+            if n + len(rows) > len(embeddings):  # Rows added while paging
+                embeddings = np.resize(embeddings, (n + len(rows), self.dim))
+            page_metadata, _, page_skipped = self._parse_rows(rows, embeddings[n:])
+            metadata.extend(page_metadata)
+            skipped.extend(page_skipped)
+
+        if skipped:
+            logger.warning(
+                f"Skipped {len(skipped)} embeddings with incorrect length",
+                extra={"skipped_chunks": skipped},
+            )
+
+        snapshot = self._empty_snapshot()
+        snapshot.watermark = watermark
 
         logger.info("Indexing embeddings...")
-        faiss.normalize_L2(embeddings.astype(np.float32))
-        gpu_index_flat.add(embeddings)
-        logger.info(f"Indexing complete. {gpu_index_flat.ntotal} embeddings indexed.")
-
-        self.index = gpu_index_flat
-        self.metadata = metadata
-
-    async def retrieve_chunks(self, input_body: RetrievalInput) -> RetrievalResults:
-        def search_filter(doc):
-            return doc["page"] in input_body.page_slugs
-
-        query_embedding = np.array([self.embed_query(input_body.text)])
-        faiss.normalize_L2(query_embedding.astype(np.float32))
-
-        search_docs = []
-        if input_body.retrieve_strategy == RetrievalStrategy.least_similar:
-            similarities, results = self.index.search(query_embedding * -1, 1000)
-            # apply filter
-            for j, i in enumerate(results[0]):
-                doc = self.metadata[i]
-                if search_filter(doc):
-                    search_docs.append((doc, similarities[0][j]))
-        else:
-            similarities, results = self.index.search(query_embedding, 20)
-            # apply filter
-            for j, i in enumerate(results[0]):
-                doc = self.metadata[i]
-                if (
-                    search_filter(doc)
-                    and similarities[0][j] >= input_body.similarity_threshold
-                ):
-                    search_docs.append((doc, similarities[0][j]))
-
-        search_docs = sorted(search_docs, key=lambda x: x[1], reverse=True)[
+        await asyncio.to_thread(
+            self._add, snapshot, metadata, embeddings[: len(metadata)]
+        )
+        await self._publish(snapshot)
+        logger.info(
+            f"Indexing complete. {len(snapshot.metadata)} embeddings indexed"
+            f" in version {snapshot.version}."
+        )
+
+        await asyncio.to_thread(self.save_snapshot, snapshot)
+
+    async def _upsert_chunks(
+        self, snapshot: IndexSnapshot, chunk_slugs: list[str]
+    ) -> None:
+        """Fetches the given chunks from the vector store and adds them to the
+        snapshot, replacing the previous vectors of any chunks already indexed."""
+        response = (
+            await self.supabase.table("embeddings")
+            .select(*self._columns)
+            .in_("chunk", chunk_slugs)
+            .execute()
+        )
+        await asyncio.to_thread(self._apply_rows, snapshot, response.data, chunk_slugs)
+
+    def _apply_rows(
+        self, snapshot: IndexSnapshot, rows: list[dict], chunk_slugs
+    ) -> bool:
+        """Upsert freshly fetched rows of the given chunks.
+        Chunks without a row or without a valid embedding are dropped.
+        Rows that are already indexed as they are are skipped, so applying
+        rows again changes nothing. Returns True if anything changed."""
+        metadata, embeddings, skipped = self._parse_rows(rows)
+        if skipped:
+            logger.warning(f"Skipping {skipped} due to incorrect embedding length")
+
+        fetched = {data["chunk"] for data in metadata}
+        stale = [
+            slug
+            for slug in chunk_slugs
+            if slug not in fetched and slug in snapshot.metadata
+        ]
+        changed = [
+            n
+            for n, data in enumerate(metadata)
+            if not self._indexed(snapshot, data, embeddings[n])
+        ]
+        self._remove(snapshot, stale)
+        self._add(snapshot, [metadata[n] for n in changed], embeddings[changed])
+        snapshot.watermark = self._max_watermark(rows, snapshot.watermark)
+        return bool(stale or changed)
+
+    def _indexed(self, snapshot: IndexSnapshot, data: dict, vector: np.ndarray) -> bool:
+        """Whether a chunk is in the snapshot's partitions with this metadata
+        and vector. False for chunks added by the unpublished write."""
+        chunk_id = snapshot.metadata.id_of(data["chunk"])
+        if chunk_id is None or snapshot.metadata.get(chunk_id) != data:
+            return False
+        partition = snapshot.pages.get(data["page"])
+        if partition is None:
+            return False
+        row = int(np.searchsorted(partition.ids, chunk_id))
+        return (
+            row < len(partition.ids)
+            and partition.ids[row] == chunk_id
+            and np.array_equal(partition.vectors[row], vector)
+        )
+
+    def _remove(self, snapshot: IndexSnapshot, chunk_slugs) -> None:
+        for slug in chunk_slugs:
+            chunk_id = snapshot.metadata.id_of(slug)
+            if chunk_id is None:
+                continue
+            snapshot.dirty_pages.add(snapshot.metadata.page(chunk_id))
+            snapshot.metadata.remove(slug)
+            snapshot.removed_ids.add(chunk_id)
+
+    def _remove_unused(
+        self, snapshot: IndexSnapshot, input_body: DeleteUnusedInput
+    ) -> None:
+        """Removes indexed chunks of a page that are not in the chunk slugs list.
+        Mirrors SupabaseClient.delete_unused."""
+        keep = set(input_body.chunk_slugs)
+        page_ids = snapshot.metadata.ids_on_page(input_body.page_slug).tolist()
+        unused_slugs = [
+            snapshot.metadata.slug(chunk_id)
+            for chunk_id in page_ids
+            if snapshot.metadata.slug(chunk_id) not in keep
+        ]
+        self._remove(snapshot, unused_slugs)
+
+    def submit_rebuild(self) -> IndexJob:
+        """Queues a rebuild of the index from the full vector store."""
+        return self._submit(IndexJobKind.rebuild, None)
+
+    def submit_upsert(self, chunk_slugs: list[str]) -> IndexJob:
+        """Queues an update of the given chunks from the vector store."""
+        return self._submit(IndexJobKind.upsert, chunk_slugs)
+
+    def submit_remove_unused(self, input_body: DeleteUnusedInput) -> IndexJob:
+        """Queues the removal of a page's chunks that are not in the list."""
+        return self._submit(IndexJobKind.remove_unused, input_body)
+
+    def _submit(self, kind: IndexJobKind, payload) -> IndexJob:
+        job = IndexJob(job_id=uuid.uuid4().hex, kind=kind)
+        self.jobs[job.job_id] = job
+        self._queue.put_nowait((job, payload))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run_jobs())
+        return job
+
+    async def _run_jobs(self) -> None:
+        """Applies queued jobs in order. All jobs waiting when the worker
+        becomes free are applied together and published as one snapshot.
+        A rebuild reads the whole vector store, so it covers every other
+        job in the batch."""
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for job, _ in batch:
+                job.status = IndexJobStatus.running
+
+            try:
+                if any(job.kind == IndexJobKind.rebuild for job, _ in batch):
+                    await self.create_faiss_index()
+                else:
+                    await self._apply_jobs(batch)
+            except Exception as error:
+                logger.exception("FAISS index job failed")
+                for job, _ in batch:
+                    job.status = IndexJobStatus.failed
+                    job.error = repr(error)
+            else:
+                for job, _ in batch:
+                    job.status = IndexJobStatus.succeeded
+                    job.index_version = self.snapshot.version
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _apply_jobs(self, batch: list[tuple[IndexJob, object]]) -> None:
+        """Applies a batch to a copy of the published snapshot. Changes are
+        made in threads, and the copy only costs the changes not yet merged
+        (see IndexSnapshot)."""
+        snapshot = self._copy(self.snapshot)
+        for job, payload in batch:
+            if job.kind == IndexJobKind.upsert:
+                await self._upsert_chunks(snapshot, payload)
+            elif job.kind == IndexJobKind.remove_unused:
+                await asyncio.to_thread(self._remove_unused, snapshot, payload)
+        await self._publish(snapshot)
+
+    def job(self, job_id: str) -> IndexJob | None:
+        return self.jobs.get(job_id)
+
+    async def join(self) -> None:
+        """Waits until every submitted job has been applied."""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """Stops the job worker. Queued jobs are dropped."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def load(self) -> None:
+        """Loads the index at startup.
+
+        Uses the latest snapshot if there is one, then syncs the rows that
+        changed since it was written. If Supabase is slow or unavailable,
+        the snapshot is served as is. Without a usable snapshot, the index
+        is rebuilt from the vector store.
+        """
+        snapshot = self._load_snapshot()
+        if snapshot is None:
+            await self.create_faiss_index()
+            return
+        await self._publish(snapshot)
+
+        try:
+            changed = await asyncio.wait_for(self.sync(), timeout=self.sync_timeout)
+        except Exception as error:
+            logger.error(f"Serving FAISS snapshot without syncing: {error!r}")
+            return
+
+        if changed:
+            await asyncio.to_thread(self.save_snapshot, self.snapshot)
+
+    async def sync(self) -> bool:
+        """Applies rows updated since the watermark and drops chunks that
+        were deleted from the vector store. Returns True if anything changed.
+        Changes are applied to a copy, which is published when complete.
+
+        updated_at is set when a transaction starts, so a row can commit
+        after rows with later timestamps were read. Rows updated up to
+        sync_overlap seconds before the watermark are read again, and those
+        already indexed are skipped.
+        """
+        snapshot = self._copy(self.snapshot)
+        watermark = snapshot.watermark
+        since = None
+        if watermark is not None:
+            overlap = timedelta(seconds=self.sync_overlap)
+            since = (datetime.fromisoformat(watermark) - overlap).isoformat()
+        changed = False
+        async for rows, _ in self._fetch_pages(since=since):
+            if rows:
+                slugs = [row["chunk"] for row in rows]
+                if await asyncio.to_thread(self._apply_rows, snapshot, rows, slugs):
+                    changed = True
+        # Keep the next sync short even if the rows read were unchanged
+        changed = changed or snapshot.watermark != watermark
+
+        current_slugs = set()
+        async for rows, _ in self._fetch_pages(columns=["chunk"]):
+            current_slugs.update(row["chunk"] for row in rows)
+        deleted = set(snapshot.metadata) - current_slugs
+        if deleted:
+            await asyncio.to_thread(self._remove, snapshot, deleted)
+            changed = True
+
+        if changed:
+            await self._publish(snapshot)
+        logger.info(
+            f"Synced FAISS index. {len(self.snapshot.metadata)} embeddings indexed."
+        )
+        return changed
+
+    def _current_snapshot(self) -> Path | None:
+        if not self.snapshot_dir:
+            return None
+        try:
+            version = (self.snapshot_dir / "CURRENT").read_text().strip()
+        except OSError:
+            return None
+        return self.snapshot_dir / version
+
+    def save_snapshot(self, snapshot: IndexSnapshot) -> None:
+        """Writes a published snapshot to a new versioned snapshot directory.
+
+        Vectors are stored sorted by page, so that each page partition is a
+        contiguous row range of vectors.npy. The snapshot is written to a
+        temporary directory and published by atomically replacing CURRENT.
+        """
+        if not self.snapshot_dir:
+            return
+
+        partitions = sorted(snapshot.pages.items())
+        ids = np.concatenate(
+            [np.empty(0, dtype=np.int64)] + [part.ids for _, part in partitions]
+        )
+        vectors = np.concatenate(
+            [np.empty((0, self.dim), dtype=np.float32)]
+            + [part.vectors for _, part in partitions]
+        )
+        page_ranges = {}
+        start = 0
+        for page_slug, partition in partitions:
+            page_ranges[page_slug] = [start, start + len(partition.ids)]
+            start += len(partition.ids)
+
+        version = f"v{time.time_ns()}"
+        tmp_path = self.snapshot_dir / f".{version}"
+        tmp_path.mkdir(parents=True)
+
+        np.save(tmp_path / "ids.npy", ids)
+        np.save(tmp_path / "vectors.npy", vectors)
+        snapshot.metadata.save(tmp_path / "metadata")
+        search = None
+        if self.backend != IndexBackend.gpu_flat:
+            search_index = snapshot.search_index
+            with search_index.lock:  # Later versions may be appending to it
+                faiss.write_index(search_index.index, str(tmp_path / "index.faiss"))
+            np.save(tmp_path / "labels.npy", search_index.labels[: search_index.n_rows])
+            np.save(tmp_path / "tombstones.npy", search_index.tombstones)
+            search = {
+                "built_rows": search_index.built_rows,
+                "drift": search_index.drift,
+            }
+        manifest = {
+            "format": self.snapshot_format,
+            "dim": self.dim,
+            "backend": self.backend,
+            "ntotal": len(ids),
+            "watermark": snapshot.watermark,
+            "pages": page_ranges,
+            "search": search,
+        }
+        (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+
+        tmp_path.rename(self.snapshot_dir / version)
+        previous = self._current_snapshot()
+        current_file = self.snapshot_dir / f".CURRENT.{version}"
+        current_file.write_text(version)
+        os.replace(current_file, self.snapshot_dir / "CURRENT")
+        logger.info(f"Saved FAISS snapshot {version} with {len(ids)} embeddings.")
+
+        # Keep the previous snapshot for processes that are still loading it
+        keep = {version, previous.name if previous else None}
+        for path in self.snapshot_dir.glob("v*"):
+            if path.name not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _load_snapshot(self) -> IndexSnapshot | None:
+        """Loads the current snapshot from disk, unpublished. Returns None if
+        there is none or it cannot be used. vectors.npy and a cpu_flat index
+        are memory-mapped, and the page partitions are views into vectors.npy,
+        so processes on a node share one copy of the vectors. Flat indexes
+        are only memory-mapped with IO_FLAG_MMAP_IFC (FAISS 1.10 and later),
+        and read into memory by older versions. A memory-mapped index is
+        read-only, so the first write rebuilds it."""
+        path = self._current_snapshot()
+        if path is None:
+            return None
+
+        try:
+            manifest = json.loads((path / "manifest.json").read_text())
+            if (
+                manifest["format"] != self.snapshot_format
+                or manifest["dim"] != self.dim
+            ):
+                logger.info(f"Ignoring incompatible FAISS snapshot {path.name}")
+                return None
+            ids = np.load(path / "ids.npy")
+            vectors = np.load(path / "vectors.npy", mmap_mode="r")
+            metadata = ChunkMetadata.load(path / "metadata")
+            search_index = self._load_search_index(path, manifest)
+        except (OSError, ValueError, KeyError, RuntimeError) as error:
+            logger.error(f"Failed to load FAISS snapshot {path.name}: {error!r}")
+            return None
+
+        snapshot = IndexSnapshot(
+            metadata=metadata,
+            search_index=search_index,
+            watermark=manifest["watermark"],
+        )
+
+        for page_slug, (start, end) in manifest["pages"].items():
+            page_vectors = vectors[start:end]
+            snapshot.pages[page_slug] = PagePartition(
+                ids=ids[start:end],
+                vectors=page_vectors,
+                centroid=np.asarray(page_vectors.mean(axis=0), dtype=np.float32),
+            )
+
+        logger.info(f"Loaded FAISS snapshot {path.name}. {len(metadata)} embeddings.")
+        return snapshot
+
+    def _load_search_index(self, path: Path, manifest: dict) -> SearchIndex | None:
+        """The saved search index, if it was saved for this backend."""
+        search = manifest["search"]
+        if manifest["backend"] != self.backend or search is None:
+            return None
+        flags = 0
+        if self.backend == IndexBackend.cpu_flat:
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        search_index = SearchIndex.build(
+            faiss.read_index(str(path / "index.faiss"), flags),
+            np.load(path / "labels.npy"),
+            self._index_lock,
+        )
+        search_index.tombstones = np.load(path / "tombstones.npy")
+        search_index.built_rows = search["built_rows"]
+        search_index.drift = search["drift"]
+        search_index.read_only = flags == getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+        return search_index
+
+    def benchmark_backends(
+        self, n_queries: int = 200, k: int = 20
+    ) -> list[IndexBackendReport]:
+        """Compare each backend against exact search on the current corpus.
+        Queries are perturbed copies of randomly sampled indexed vectors.
+        Recall is the mean overlap between each backend's top k and the exact
+        top k. GPU backends are skipped on nodes without a GPU."""
+        ids, vectors = self._vectors(self._current())
+        ntotal = len(ids)
+        if ntotal == 0:
+            return []
+
+        rng = np.random.default_rng(0)
+        sample = rng.choice(ntotal, size=min(n_queries, ntotal), replace=False)
+        queries = vectors[sample]
+        queries += rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+        faiss.normalize_L2(queries)
+        k = min(k, ntotal)
+
+        exact_index = faiss.IndexFlatIP(self.dim)
+        exact_index.add(vectors)
+        _, rows = exact_index.search(queries, k)
+        exact = ids[rows]
+
+        reports = []
+        for backend in IndexBackend:
+            if backend == IndexBackend.gpu_flat and faiss.get_num_gpus() == 0:
+                continue
+
+            start = time.perf_counter()
+            index = self._build_search_index(ids, vectors, backend)
+            if backend == IndexBackend.gpu_flat:
+                # Not the shared resources, which the event loop thread uses
+                index = self._to_gpu(index, faiss.StandardGpuResources())
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for query in queries:
+                index.search(query[None, :], k)
+            latency = (time.perf_counter() - start) / len(queries)
+
+            _, results = index.search(queries, k)
+            recall = np.mean(
+                [
+                    len(set(found) & set(expected)) / k
+                    for found, expected in zip(results, exact)
+                ]
+            )
+
+            reports.append(
+                IndexBackendReport(
+                    backend=backend,
+                    ntotal=ntotal,
+                    k=k,
+                    recall=float(recall),
+                    latency_ms=latency * 1000,
+                    build_time_ms=build_time * 1000,
+                )
+            )
+
+        return reports
+
+    def _search(
+        self, snapshot: IndexSnapshot, queries: np.ndarray, k: int
+    ) -> list[list[tuple[int, float]]]:
+        """Search the whole corpus with a (n, dim) query matrix in one call.
+        Returns (chunk ID, similarity) hits per query. Empty slots are dropped."""
+        similarities, results = snapshot.search_index.search(queries, k)
+        return [
+            [(i, similarity) for i, similarity in zip(ids, sims) if i != -1]
+            for ids, sims in zip(results.tolist(), similarities.tolist())
+        ]
+
+    def _search_pages(
+        self,
+        snapshot: IndexSnapshot,
+        queries: np.ndarray,
+        page_slugs: list[list[str]],
+    ) -> list[list[tuple[int, float]]]:
+        """Exact inner product between each query and every chunk of its pages.
+
+        The partitions of all requested pages are stacked once and scored
+        with a single matrix product. Each query then keeps the columns of
+        its own pages. Unknown pages are ignored.
+        """
+        requested = sorted({slug for slugs in page_slugs for slug in slugs})
+        partitions = {
+            slug: snapshot.pages[slug] for slug in requested if slug in snapshot.pages
+        }
+        if not partitions:
+            return [[] for _ in page_slugs]
+
+        offsets = {}
+        start = 0
+        for slug, partition in partitions.items():
+            offsets[slug] = (start, start + len(partition.ids))
+            start += len(partition.ids)
+        ids = np.concatenate([partition.ids for partition in partitions.values()])
+        vectors = np.concatenate(
+            [partition.vectors for partition in partitions.values()]
+        )
+        scores = queries @ vectors.T
+
+        hits = []
+        for row, slugs in enumerate(page_slugs):
+            columns = np.concatenate(
+                [
+                    np.arange(*offsets[slug])
+                    for slug in dict.fromkeys(slugs)
+                    if slug in offsets
+                ]
+                or [np.empty(0, dtype=np.int64)]
+            )
+            hits.append(list(zip(ids[columns].tolist(), scores[row, columns].tolist())))
+        return hits
+
+    def _rank(
+        self,
+        snapshot: IndexSnapshot,
+        input_body: RetrievalInput,
+        hits: list[tuple[int, float]],
+    ) -> RetrievalResults:
+        if input_body.retrieve_strategy == RetrievalStrategy.most_similar:
+            hits = [
+                (i, similarity)
+                for i, similarity in hits
+                if similarity >= input_body.similarity_threshold
+            ]
+
+        hits = sorted(hits, key=lambda x: x[1], reverse=True)[
             0 : input_body.match_count
         ]
         matches = [
             {
-                "chunk": doc[0]["chunk"],
-                "page": doc[0]["page"],
-                "content": doc[0]["context"],
-                "similarity": doc[1],
+                "chunk": snapshot.metadata.slug(i),
+                "page": snapshot.metadata.page(i),
+                "content": snapshot.metadata.content_of(i),
+                "similarity": similarity,
             }
-            for doc in search_docs
+            for i, similarity in hits
         ]
         return RetrievalResults(matches=matches)
 
-    async def page_similarity(self, embedding: list[float], page_slug: str) -> float:
-        """Returns the similarity between the embedding and the target page."""
-        embedding_arr = np.array([embedding])
-        faiss.normalize_L2(embedding_arr.astype(np.float32))
+    async def retrieve_chunks(
+        self,
+        input_body: RetrievalInput,
+        embedding: Optional[list[float]] = None,
+    ) -> RetrievalResults:
+        """Retrieves chunks for a query.
+        Pass the embedding of input_body.text if it was already computed."""
+        embeddings = None if embedding is None else np.array([embedding])
+        results = await self.retrieve_chunks_batch([input_body], embeddings)
+        return results[0]
+
+    async def retrieve_chunks_batch(
+        self,
+        inputs: list[RetrievalInput],
+        embeddings: Optional[np.ndarray] = None,
+    ) -> list[RetrievalResults]:
+        """Retrieves chunks for many queries, returned in request order.
+
+        Queries are embedded together, page-scoped queries are scored with
+        one matrix product, and corpus-wide queries (all_pages) share one
+        search index call. Queries with no pages match nothing. If embeddings
+        are given, they are used instead of embedding the query texts.
+        """
+        if not inputs:
+            return []
+
+        snapshot = self._current()
+
+        if embeddings is None:
+            queries = await self.embed_queries(
+                [input_body.text for input_body in inputs]
+            )
+        else:
+            queries = np.array(embeddings, dtype=np.float32)
+            faiss.normalize_L2(queries)
+
+        # Score against the negated query so the least similar rank first
+        least_similar = np.array(
+            [
+                input_body.retrieve_strategy == RetrievalStrategy.least_similar
+                for input_body in inputs
+            ]
+        )
+        queries[least_similar] *= -1
+
+        hits: list[list[tuple[int, float]]] = [[] for _ in inputs]
 
-        distances, results = self.index.search(embedding_arr, 1000)
+        paged = [
+            n
+            for n, input_body in enumerate(inputs)
+            if input_body.page_slugs and not input_body.all_pages
+        ]
+        if paged:
+            page_slugs = [inputs[n].page_slugs for n in paged]
+            for n, page_hits in zip(
+                paged, self._search_pages(snapshot, queries[paged], page_slugs)
+            ):
+                hits[n] = page_hits
+
+        unpaged = [n for n, input_body in enumerate(inputs) if input_body.all_pages]
+        if unpaged:
+            corpus_hits = self._search(snapshot, queries[unpaged], 1000)
+            for n, query_hits in zip(unpaged, corpus_hits):
+                hits[n] = query_hits
 
-        similarities = [
-            distances[0][j]
-            for j, i in enumerate(results[0])
-            if self.metadata[i]["page"] == page_slug
+        return [
+            self._rank(snapshot, input_body, input_hits)
+            for input_body, input_hits in zip(inputs, hits)
         ]
 
-        if len(similarities) == 0:
+    async def page_similarity(self, embedding: list[float], page_slug: str) -> float:
+        """Returns the similarity between the embedding and the target page."""
+        embedding_arr = np.array([embedding], dtype=np.float32)
+        faiss.normalize_L2(embedding_arr)
+
+        partition = self._current().pages.get(page_slug)
+
+        if partition is None:
             return -100.0
 
-        cosine_similarity = sum(similarities) / len(similarities)
+        # Mean cosine similarity to the page's chunks, see PagePartition
+        cosine_similarity = float(partition.centroid @ embedding_arr[0])
 
         if cosine_similarity < -1.0:
             logger.error(
                 "Cosine similarity is less than -1.0",
                 extra={
                     "cosine_similarity": cosine_similarity,
-                    "distances": distances,
-                    "results": results,
-                    "similarities": similarities,
+                    "page_slug": page_slug,
                 },
             )
 
@@ -149,10 +1161,15 @@ class FAISS_Wrapper:
                 "Cosine similarity is less than -1.0",
                 extras={
                     "cosine_similarity": cosine_similarity,
-                    "distances": distances,
-                    "results": results,
-                    "similarities": similarities,
+                    "page_slug": page_slug,
                 },
             )
 
         return cosine_similarity
+
+
+async def pin_snapshot(request: Request) -> AsyncGenerator[None, None]:
+    """Router dependency that pins the published FAISS index snapshot
+    for the duration of the request."""
+    with request.app.state.faiss.pinned():
+        yield
@@ -9,6 +9,7 @@ from pydantic import ValidationError
 from ..schemas.strapi import (
     Chunk,
     PageWithChunksResponse,
+    PageWithContent,
     PageWithVolumeResponse,
     Volume,
 )
@@ -175,8 +176,12 @@ class Strapi:
         return text_meta
 
     async def get_chunks(self, page_slug: str) -> list[Chunk]:
+        """Should return a list of component dictionaries."""
+        return (await self.get_page(page_slug)).content
+
+    async def get_page(self, page_slug: str) -> PageWithContent:
         """Used for summary scoring.
-        Should return a list of component dictionaries."""
+        Returns the page with its chunks and revision timestamps."""
         json_response = await self.get_entries(
             plural_api_id="pages",
             filters={"Slug": {"$eq": page_slug}},
@@ -192,7 +197,7 @@ class Strapi:
                 detail=f"No chunks found for {page_slug}. {error}",
             )
 
-        return page_with_chunks.data[0].content
+        return page_with_chunks.data[0]
 
 
 async def get_strapi() -> AsyncGenerator[Strapi, None]:
@@ -1,6 +1,9 @@
+import hashlib
+import logging
 import tomllib
 
 from fastapi import HTTPException, Response
+from postgrest.exceptions import APIError
 from pydantic import ValidationError
 from supabase.client import AsyncClient
 
@@ -8,65 +11,192 @@ from ..pipelines.embed import EmbeddingPipeline
 from ..schemas.embedding import (
     ChunkInput,
     DeleteUnusedInput,
+    PageEmbeddingInput,
     RetrievalInput,
     RetrievalResults,
 )
 from ..schemas.prior import VolumePrior
 
+logger = logging.getLogger("itell_ai")
+
 with open("assets/global_prior.toml", "rb") as f:
     global_prior = tomllib.load(f)
 
+# Columns compared to decide whether a chunk changed since it was embedded
+content_columns = ["text", "module", "chapter", "page", "chunk", "content_hash"]
+undefined_column = "42703"  # PostgreSQL error code
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
 
 class SupabaseClient(AsyncClient):
     """Supabase client with custom methods for embedding and retrieval.
     Caching is not possible since each embedding will be different.
     Could improve performance by creating a local copy of the relatively small
-    vector store and querying that instead of the remote database."""
+    vector store and querying that instead of the remote database.
+
+    Rows of the embeddings table carry a content_hash column with the SHA-256
+    of their content, used to skip chunks that did not change. Until the
+    column is added (see supabase/migrations), the content itself is compared."""
 
-    embedding_pipeline = EmbeddingPipeline()
+    has_content_hash = True  # Set to False once the column is found missing
 
     async def embed(self, text: str) -> list[float]:
-        return self.embedding_pipeline(text)[0].tolist()
+        pipeline = await EmbeddingPipeline.ashared()
+        return (await pipeline.aembed([text]))[0].tolist()
+
+    async def embedding_generate(
+        self, input_body: ChunkInput
+    ) -> tuple[list[str], list[str]]:
+        """Embeds a chunk and saves it to the vector store, unless it is
+        stored unchanged. Returns the slugs of the upserted and skipped chunks."""
+        return await self._write_chunks([input_body])
+
+    async def page_embeddings_generate(
+        self, input_body: PageEmbeddingInput
+    ) -> tuple[list[str], list[str], list[str]]:
+        """Embeds every changed chunk of a page and saves them with one bulk
+        upsert. If chunk_slugs is given, stale chunks of the page are deleted
+        in the same transaction by the write_page_embeddings function (see
+        supabase/migrations), so a failed request changes nothing.
+        Returns the slugs of the upserted, skipped and deleted chunks."""
+        chunks = [
+            ChunkInput(
+                text_slug=input_body.text_slug,
+                module_slug=input_body.module_slug,
+                chapter_slug=input_body.chapter_slug,
+                page_slug=input_body.page_slug,
+                chunk_slug=chunk.chunk_slug,
+                content=chunk.content,
+            )
+            for chunk in input_body.chunks
+        ]
+        if input_body.chunk_slugs is None:
+            upserted, skipped = await self._write_chunks(chunks)
+            return upserted, skipped, []
+
+        rows, skipped = await self._embed_changed(chunks)
+        upserted = [row["chunk"] for row in rows]
+        response = await self.rpc(
+            "write_page_embeddings",
+            {
+                "target_page": input_body.page_slug,
+                "page_rows": rows,
+                "keep": sorted({*input_body.chunk_slugs, *upserted, *skipped}),
+            },
+        ).execute()
+        deleted = [row["deleted_chunk"] for row in response.data]
+
+        return upserted, skipped, deleted
+
+    async def _write_chunks(
+        self, chunks: list[ChunkInput]
+    ) -> tuple[list[str], list[str]]:
+        """Embeds the changed chunks and saves them with one bulk upsert.
+        Returns the slugs of the upserted and skipped chunks."""
+        rows, skipped = await self._embed_changed(chunks)
+        if rows:
+            await self.table("embeddings").upsert(rows).execute()
+        return [row["chunk"] for row in rows], skipped
+
+    async def _embed_changed(
+        self, chunks: list[ChunkInput]
+    ) -> tuple[list[dict], list[str]]:
+        """Embeds chunks in length-sorted batches. Chunks whose stored row has
+        the same content hash and slugs are skipped, so republishing a page
+        only embeds what changed. Returns the rows to upsert, with their
+        embeddings, and the slugs of the skipped chunks."""
+        rows = [
+            {
+                "text": chunk.text_slug,
+                "module": chunk.module_slug,
+                "chapter": chunk.chapter_slug,
+                "page": chunk.page_slug,
+                "chunk": chunk.chunk_slug,
+                "content": chunk.content,
+                "content_hash": content_hash(chunk.content),
+            }
+            for chunk in chunks
+        ]
+        stored = await self._stored_rows([chunk.chunk_slug for chunk in chunks])
 
-    async def embedding_generate(self, input_body: ChunkInput) -> Response:
+        def unchanged(row: dict) -> bool:
+            stored_row = stored.get(row["chunk"])
+            return stored_row is not None and stored_row == {
+                column: row[column] for column in stored_row
+            }
 
-        embedding = await self.embed(input_body.content)
+        changed = [row for row in rows if not unchanged(row)]
+        skipped = [row["chunk"] for row in rows if unchanged(row)]
 
-        await (
-            self.table("embeddings")
-            .upsert(
-                {
-                    "text": input_body.text_slug,
-                    "module": input_body.module_slug,
-                    "chapter": input_body.chapter_slug,
-                    "page": input_body.page_slug,
-                    "chunk": input_body.chunk_slug,
-                    "content": input_body.content,
-                    "embedding": embedding,
-                }
-            )
+        if not self.has_content_hash:
+            for row in changed:
+                del row["content_hash"]
+
+        if not changed:
+            return [], skipped
+
+        pipeline = await EmbeddingPipeline.ashared()
+        embeddings = await pipeline.aembed_bulk([row["content"] for row in changed])
+        rows = [
+            {**row, "embedding": embedding.tolist()}
+            for row, embedding in zip(changed, embeddings)
+        ]
+        return rows, skipped
+
+    async def _stored_rows(self, chunk_slugs: list[str]) -> dict[str, dict]:
+        """Stored slugs and content hashes of the given chunks. Without the
+        content_hash column, the stored content is returned instead."""
+        if not chunk_slugs:
+            return {}
+        if self.has_content_hash:
+            try:
+                return await self._select_chunks(content_columns, chunk_slugs)
+            except APIError as error:
+                if error.code != undefined_column:
+                    raise
+                logger.warning(
+                    "The embeddings table has no content_hash column. "
+                    "Comparing chunk content instead."
+                )
+                self.has_content_hash = False
+        columns = [c for c in content_columns if c != "content_hash"] + ["content"]
+        return await self._select_chunks(columns, chunk_slugs)
+
+    async def _select_chunks(
+        self, columns: list[str], chunk_slugs: list[str]
+    ) -> dict[str, dict]:
+        response = (
+            await self.table("embeddings")
+            .select(*columns)
+            .in_("chunk", chunk_slugs)
             .execute()
         )
-
-        return Response(status_code=201)
+        return {row["chunk"]: row for row in response.data}
 
     async def delete_unused(self, input_body: DeleteUnusedInput) -> Response:
         """Deletes all chunks not in the chunk slugs list."""
+        await self._delete_unused(input_body.page_slug, set(input_body.chunk_slugs))
+        return Response(status_code=202)
+
+    async def _delete_unused(self, page_slug: str, keep: set[str]) -> list[str]:
+        """Deletes the chunks of a page that are not in keep.
+        Returns the deleted slugs."""
 
         response = (
             await self.table("embeddings")
             .select("chunk")
-            .eq("page", input_body.page_slug)
+            .eq("page", page_slug)
             .execute()
         )
 
         current_slugs = response.data
 
-        # Get all chunks in current_slugs not in input_body.chunk_slugs
+        # Get all chunks in current_slugs not in keep
         unused_slugs = [
-            chunk["chunk"]
-            for chunk in current_slugs
-            if chunk["chunk"] not in input_body.chunk_slugs
+            chunk["chunk"] for chunk in current_slugs if chunk["chunk"] not in keep
         ]
 
         if unused_slugs:
@@ -77,7 +207,7 @@ class SupabaseClient(AsyncClient):
                 .execute()
             )
 
-        return Response(status_code=202)
+        return unused_slugs
 
     async def get_volume_prior(self, volume_slug: str) -> VolumePrior:
 
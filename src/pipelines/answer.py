@@ -9,11 +9,15 @@ If both models agree that it is incorrect, return 0.
 
 from transformers import pipeline
 
+from ..utils.model_registry import model_registry
+
 
 class AnswerPipeline:
     mpnet_model = "tiedaar/short-answer-classification"
     bleurt_model = "vaiibhavgupta/finetuned-bleurt-large"
     bleurt_threshold = 0.7
+    # Registry key. Both models are loaded together as one entry
+    model_name = f"{mpnet_model}+{bleurt_model}"
 
     def __init__(self):
         self.mpnet_classifier = pipeline(
@@ -25,6 +29,11 @@ class AnswerPipeline:
             "text-classification", model=self.bleurt_model
         )
 
+    @classmethod
+    def shared(cls) -> "AnswerPipeline":
+        """The process-wide instance, loaded on first use."""
+        return model_registry.get(cls.model_name, cls)
+
     def __call__(self, candidate: str, reference: str) -> int:
         bleurt_sequence = f"{candidate}[SEP]{reference}"
         mpnet_sequence = f"{candidate}</s>{reference}"
@@ -1,4 +1,11 @@
+import time
+
+import numpy as np
+from spacy.attrs import IS_STOP, LOWER
 from spacy.tokens import Doc
+from spacy.vocab import Vocab
+
+from ..schemas.summary import ContainmentBenchmarkReport
 
 
 def trigrams(doc: Doc) -> set[tuple[int, ...]]:
@@ -11,11 +18,48 @@ def trigrams(doc: Doc) -> set[tuple[int, ...]]:
     return {tuple(tokens[i : i + 3]) for i in range(len(tokens) - 2)}
 
 
-def score_containment(source: Doc, derivative: Doc) -> float:
+def _mix(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer, applied elementwise to uint64 values."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def trigram_hashes(doc: Doc) -> np.ndarray:
+    """The trigrams of trigrams(doc), each hashed to 64 bits, as a sorted
+    array of unique values. Computed without a Python loop over tokens."""
+    attrs = doc.to_array([LOWER, IS_STOP]).reshape(-1, 2)
+    tokens = attrs[attrs[:, 1] == 0, 0].astype(np.uint64)
+    if len(tokens) < 3:
+        return np.empty(0, dtype=np.uint64)
+
+    with np.errstate(over="ignore"):  # Multiplication wraps modulo 2**64
+        hashes = _mix(_mix(_mix(tokens[:-2]) ^ tokens[1:-1]) ^ tokens[2:])
+    return np.unique(hashes)
+
+
+def score_containment(source: Doc | np.ndarray, derivative: Doc) -> float:
     """Calculate containment score between a source text and a derivative
     text. Calculated as the intersection of unique trigrams divided by the
     number of unique trigrams in the derivative text. Values range from 0
-    to 1, with 1 being completely copied."""
+    to 1, with 1 being completely copied.
+
+    The source can be given as its trigram_hashes, which can be computed
+    once for a page and reused for every summary of it."""
+    src = source if isinstance(source, np.ndarray) else trigram_hashes(source)
+    deriv = trigram_hashes(derivative)
+    if not len(deriv):
+        return 1.0
+    if not len(src):
+        return 0.0
+
+    positions = np.searchsorted(src, deriv).clip(max=len(src) - 1)
+    containment = np.count_nonzero(src[positions] == deriv) / len(deriv)
+    return round(containment, 4)
+
+
+def _score_containment_sets(source: Doc, derivative: Doc) -> float:
+    """Reference implementation over Python sets of trigrams."""
     src = trigrams(source)
     deriv = trigrams(derivative)
     try:
@@ -23,3 +67,52 @@ def score_containment(source: Doc, derivative: Doc) -> float:
         return round(containment, 4)
     except ZeroDivisionError:
         return 1.0
+
+
+def benchmark_containment(
+    vocab: Vocab,
+    page_sizes: tuple[int, ...] = (1_000, 5_000, 10_000, 50_000),
+    n_summaries: int = 20,
+) -> list[ContainmentBenchmarkReport]:
+    """Compares the latency of scoring summaries against a page with Python
+    sets of trigrams and with the page's precomputed trigram_hashes.
+    Pages and summaries are random words with stop words mixed in. Each
+    summary copies part of the page, so scores range between 0 and 1."""
+    rng = np.random.default_rng(0)
+    words = ["the", "of", "and", "a", "to", "in", "is", "it"]
+    words += [f"word{n}" for n in range(2_000)]
+
+    reports = []
+    for page_size in page_sizes:
+        page_words = rng.choice(words, size=page_size).tolist()
+        source = Doc(vocab, words=page_words)
+        summaries = []
+        for _ in range(n_summaries):
+            start = int(rng.integers(0, page_size - 50))
+            copied = page_words[start : start + int(rng.integers(0, 50))]
+            summaries.append(
+                Doc(vocab, words=copied + rng.choice(words, size=50).tolist())
+            )
+
+        start_time = time.perf_counter()
+        expected = [_score_containment_sets(source, summary) for summary in summaries]
+        sets_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        source_trigrams = trigram_hashes(source)
+        index_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        actual = [score_containment(source_trigrams, summary) for summary in summaries]
+        hashed_time = time.perf_counter() - start_time
+
+        reports.append(
+            ContainmentBenchmarkReport(
+                page_tokens=page_size,
+                sets_ms=sets_time * 1000 / n_summaries,
+                hashed_ms=hashed_time * 1000 / n_summaries,
+                index_build_ms=index_time * 1000,
+                matches=actual == expected,
+            )
+        )
+    return reports
@@ -1,17 +1,68 @@
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import numpy as np
 import torch
 import torch.nn.functional as F
 from torch import Tensor
 from transformers import AutoModel, AutoTokenizer
 
+from ..schemas.models import (
+    EmbeddingBackend,
+    EmbeddingBackendReport,
+    EmbeddingBenchmarkReport,
+)
+from ..utils.embedding_cache import embedding_cache
+from ..utils.inference import embedding_pool
+from ..utils.micro_batcher import MicroBatcher
+from ..utils.model_registry import model_registry
+
 
 class EmbeddingPipeline:
     model_name = "sentence-transformers/all-MiniLM-L6-v2"
+    max_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+    max_wait_ms = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    backend = EmbeddingBackend(os.getenv("EMBEDDING_BACKEND", EmbeddingBackend.torch))
+    onnx_dir = Path(os.getenv("EMBEDDING_ONNX_DIR", "~/.cache/itell/onnx")).expanduser()
 
-    def __init__(self):
-        self.model = AutoModel.from_pretrained(self.model_name)
+    def __init__(self, backend: EmbeddingBackend | None = None):
+        """backend defaults to EMBEDDING_BACKEND. The onnx backend runs an
+        int8-quantized export of the model with ONNX Runtime, which is
+        created in EMBEDDING_ONNX_DIR on first use."""
+        self.backend = EmbeddingBackend(backend or self.backend)
+        if self.backend == EmbeddingBackend.onnx:
+            from .embed_onnx import OnnxEncoder
+
+            self.model = OnnxEncoder(self.model_name, self.onnx_dir)
+        else:
+            self.model = AutoModel.from_pretrained(self.model_name)
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Quantized embeddings differ slightly, so backends do not share cache entries
+        self.cache_key = f"{self.model_name}:{self.backend.value}"
+        self.batcher = MicroBatcher(
+            self.aforward,
+            self.max_batch_size,
+            self.max_wait_ms / 1000,
+            max_queue=embedding_pool.max_queue,
+            name=embedding_pool.name,
+        )
+
+    @classmethod
+    def shared(cls) -> "EmbeddingPipeline":
+        """The process-wide instance, loaded on first use."""
+        return model_registry.get(cls.model_name, cls)
+
+    @classmethod
+    async def ashared(cls) -> "EmbeddingPipeline":
+        """shared() for the event loop. The model is loaded in a thread."""
+        return await model_registry.aget(cls.model_name, cls)
+
+    def __call__(self, text_input: str | list[str]) -> Tensor:
+        if self.backend == EmbeddingBackend.onnx:
+            return torch.from_numpy(self.onnx_forward(text_input))
 
-    def __call__(self, text_input: str) -> Tensor:
         encoded_input = self.tokenizer(
             text_input, padding=True, truncation=True, return_tensors="pt"
         )
@@ -22,6 +73,135 @@ class EmbeddingPipeline:
 
         return embed
 
+    def onnx_forward(self, text_input: str | list[str]) -> np.ndarray:
+        """Mean pooling and L2 normalization in NumPy over the ONNX encoder."""
+        encoded_input = self.tokenizer(
+            text_input, padding=True, truncation=True, return_tensors="np"
+        )
+        token_embeddings = self.model(encoded_input)
+        mask = encoded_input["attention_mask"][..., np.newaxis].astype(np.float32)
+        embed = (token_embeddings * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        norm = np.linalg.norm(embed, axis=1, keepdims=True)
+        return (embed / np.clip(norm, 1e-12, None)).astype(np.float32)
+
+    def forward(self, texts: list[str]) -> np.ndarray:
+        """One padded forward pass over texts."""
+        return self(texts).numpy()
+
+    async def aforward(self, texts: list[str]) -> np.ndarray:
+        """forward, run in the embedding inference pool."""
+        return await embedding_pool.run(self.forward, texts)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Embed texts as a normalized (n, 384) float32 array.
+        Uses the process-wide embedding cache, so repeated texts are free."""
+        return embedding_cache.get_or_embed(self.cache_key, texts, self.forward)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        """Like embed, but texts missing from the cache go through the
+        micro-batcher, which combines concurrent requests into one forward
+        pass of up to EMBEDDING_BATCH_SIZE texts. A batch waits at most
+        EMBEDDING_BATCH_WAIT_MS for more requests to arrive."""
+
+        async def embed_missing(missing: list[str]) -> np.ndarray:
+            return np.stack(await self.batcher.submit(missing))
+
+        return await embedding_cache.aget_or_embed(self.cache_key, texts, embed_missing)
+
+    async def aembed_bulk(self, texts: list[str]) -> np.ndarray:
+        """Like aembed for many texts from one caller, such as the chunks of a
+        page. Texts missing from the cache are sorted by length and embedded
+        in batches of EMBEDDING_BATCH_SIZE, so that each batch pads to texts
+        of similar length. They skip the micro-batcher, which would only
+        split them into the same batches after waiting for other requests."""
+
+        async def embed_missing(missing: list[str]) -> np.ndarray:
+            order = sorted(range(len(missing)), key=lambda n: len(missing[n]))
+            embeddings = [None] * len(missing)
+            for start in range(0, len(order), self.max_batch_size):
+                batch = order[start : start + self.max_batch_size]
+                batch_embeddings = await self.aforward([missing[n] for n in batch])
+                for n, embedding in zip(batch, batch_embeddings):
+                    embeddings[n] = embedding
+            return np.stack(embeddings)
+
+        return await embedding_cache.aget_or_embed(self.cache_key, texts, embed_missing)
+
+    async def benchmark(self, n_requests: int = 256) -> list[EmbeddingBenchmarkReport]:
+        """Compare throughput of single-text forward passes, as made by
+        sequential callers, with n_requests concurrent callers going through
+        the micro-batcher. Texts are unique, so the cache is not involved."""
+        texts = [f"Benchmark request {n} about reading." for n in range(n_requests)]
+
+        start = time.perf_counter()
+        for text in texts:
+            await self.aforward([text])
+        unbatched = time.perf_counter() - start
+
+        batcher = MicroBatcher(
+            self.aforward, self.max_batch_size, self.max_wait_ms / 1000
+        )
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*[batcher.submit([text]) for text in texts])
+        finally:
+            await batcher.close()
+        batched = time.perf_counter() - start
+
+        return [
+            EmbeddingBenchmarkReport(
+                mode="unbatched",
+                requests=n_requests,
+                throughput=n_requests / unbatched,
+                mean_batch_size=1.0,
+            ),
+            EmbeddingBenchmarkReport(
+                mode="batched",
+                requests=n_requests,
+                throughput=n_requests / batched,
+                mean_batch_size=batcher.mean_batch_size,
+            ),
+        ]
+
+    def compare_backends(
+        self, n_texts: int = 64, batch_size: int = 32
+    ) -> list[EmbeddingBackendReport]:
+        """Latency of each backend on single texts and on batches of
+        batch_size, with the lowest cosine similarity of its embeddings to
+        this pipeline's. Loads a pipeline for every other backend."""
+        texts = [
+            f"Benchmark text {n} about reading comprehension." * (1 + n % 4)
+            for n in range(n_texts)
+        ]
+        batches = [texts[i : i + batch_size] for i in range(0, n_texts, batch_size)]
+        reference = self.forward(texts)
+
+        reports = []
+        for backend in EmbeddingBackend:
+            pipeline = self if backend == self.backend else EmbeddingPipeline(backend)
+            pipeline.forward(texts[:1])  # Warm up
+
+            start = time.perf_counter()
+            for text in texts:
+                pipeline.forward([text])
+            latency = (time.perf_counter() - start) / n_texts
+
+            start = time.perf_counter()
+            embeddings = np.concatenate([pipeline.forward(batch) for batch in batches])
+            batch_latency = (time.perf_counter() - start) / len(batches)
+
+            reports.append(
+                EmbeddingBackendReport(
+                    backend=backend,
+                    latency_ms=latency * 1000,
+                    batch_latency_ms=batch_latency * 1000,
+                    min_cosine=float(np.min(np.sum(reference * embeddings, axis=1))),
+                )
+            )
+        return reports
+
     def score_similarity(self, a: str, b: str) -> float:
         """Return semantic similarity score between a and b"""
         a_embed = self(a)
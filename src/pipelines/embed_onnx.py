@@ -0,0 +1,89 @@
+"""
+ONNX Runtime backend for the embedding model.
+The encoder is exported from PyTorch once, quantized to int8 with dynamic
+quantization, and cached on disk for later processes.
+"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModel, AutoTokenizer
+
+input_names = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+class _Encoder(torch.nn.Module):
+    """Passes positional graph inputs to the model by name and returns
+    only the last hidden state."""
+
+    def __init__(self, model: torch.nn.Module, names: list[str]) -> None:
+        super().__init__()
+        self.model = model
+        self.names = names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.names, inputs)))[0]
+
+
+def export_quantized(model_name: str, path: Path) -> None:
+    """Exports the encoder of model_name to ONNX with dynamic batch and
+    sequence axes, then writes an int8-quantized copy to path."""
+    model = AutoModel.from_pretrained(model_name).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    sample = tokenizer(["An example sentence."], return_tensors="pt")
+    names = [name for name in input_names if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    # Write to temporary files so that concurrent workers never load a
+    # partial graph
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.onnx")
+    fp32_path = path.with_name(f".{path.stem}.{os.getpid()}.fp32.onnx")
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                _Encoder(model, names),
+                tuple(sample[name] for name in names),
+                str(fp32_path),
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, path)
+    finally:
+        fp32_path.unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
+
+
+class OnnxEncoder:
+    """The int8-quantized ONNX export of a transformer encoder, run on CPU.
+    Called with tokenizer output as NumPy arrays, it returns the last hidden
+    state, like the first output of the PyTorch model."""
+
+    def __init__(self, model_name: str, cache_dir: Path) -> None:
+        self.path = cache_dir / f"{model_name.replace('/', '--')}-int8.onnx"
+        if not self.path.exists():
+            export_quantized(model_name, self.path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(self.path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [
+            model_input.name for model_input in self.session.get_inputs()
+        ]
+        self.weight_bytes = self.path.stat().st_size  # Reported by the model registry
+
+    def __call__(self, encoded) -> np.ndarray:
+        inputs = {
+            name: np.asarray(encoded[name], dtype=np.int64) for name in self.input_names
+        }
+        return self.session.run(None, inputs)[0]
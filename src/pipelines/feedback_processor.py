@@ -17,6 +17,9 @@ class FeedbackProcessor:
 
     Feedback_indexers determine how the score (and threshold) should be translated
     into an int that is used to index the appropriate feedback string.
+
+    If junk_filter is True, failing this score fails the summary before it is
+    scored for content.
     """
 
     op_dict = {"gt": operator.gt, "lt": operator.lt, "eq": operator.eq}
@@ -27,11 +30,13 @@ class FeedbackProcessor:
         threshold: float | bool,
         comparator: Literal["gt", "lt", "eq"],
         feedback: list[str],
+        junk_filter: bool = False,
     ):
         self.score_type = score_type
         self.threshold = threshold
         self.comparator = self.op_dict[comparator]
         self.feedback = feedback
+        self.junk_filter = junk_filter
         if len(feedback) > 2:
             # If there are more than 2 feedback strings, use the floor indexer
             self.feedback_indexer = self._floor_indexer
@@ -1,53 +1,120 @@
 import random
-import re
+from collections import deque
 
 from spacy.tokens import Doc
 
+from ..schemas.strapi import Chunk
 from .nlp import nlp
 
 
-def suggest_keyphrases(summary: Doc, chunks: list) -> tuple[list[str], list[str]]:
+class PhraseAutomaton:
+    """Aho-Corasick automaton that finds which of a set of patterns occur as
+    substrings of a text in a single pass over the text."""
+
+    def __init__(self, patterns: list[str]) -> None:
+        self.goto: list[dict[str, int]] = [{}]
+        self.fail = [0]
+        self.output: list[set[int]] = [set()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                if char not in self.goto[node]:
+                    self.goto[node][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                node = self.goto[node][char]
+            self.output[node].add(pattern_id)
+
+        # Breadth-first, so the failure links of shallower nodes are final
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                if node and char in self.goto[fail]:
+                    self.fail[child] = self.goto[fail][char]
+                self.output[child] |= self.output[self.fail[child]]
+
+    def search(self, text: str) -> set[int]:
+        """Returns the ids of the patterns found in text."""
+        found = set(self.output[0])  # Empty patterns match any text
+        node = 0
+        for char in text:
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            found |= self.output[node]
+        return found
+
+
+class KeyphraseMatcher:
+    """The keyphrases of a page's chunks, lemmatized once and compiled into
+    a single automaton. Built once per page revision and shared between
+    requests."""
+
+    def __init__(self, chunks: list[Chunk]) -> None:
+        phrases = [
+            (chunk.slug, keyphrase)
+            for chunk in chunks
+            if chunk.keyphrases
+            for keyphrase in chunk.keyphrases
+        ]
+        patterns: dict[str, int] = {}
+        # (chunk slug, keyphrase text, pattern id) in page order
+        self.keyphrases: list[tuple[str, str, int]] = []
+        for (slug, _), keyphrase in zip(phrases, nlp.pipe(p for _, p in phrases)):
+            pattern = " ".join(t.lemma_ for t in keyphrase if not t.is_stop).lower()
+            pattern_id = patterns.setdefault(pattern, len(patterns))
+            self.keyphrases.append((slug, keyphrase.text, pattern_id))
+        self.automaton = PhraseAutomaton(list(patterns))
+
+    def suggest(
+        self, summary: Doc, weights: dict[str, float]
+    ) -> tuple[list[str], list[str]]:
+        """suggest_keyphrases for the chunks with the given weights by slug."""
+        summary_lemmas = " ".join([t.lemma_.lower() for t in summary if not t.is_stop])
+        found = self.automaton.search(summary_lemmas)
+
+        included_keyphrases = list()
+        # Keyphrases not included in the summary, weighted by inverse focus
+        # time and summed over the chunks they appear in
+        candidate_weights: dict[str, float] = dict()
+        for slug, text, pattern_id in self.keyphrases:
+            if slug not in weights:
+                continue
+            if pattern_id in found:
+                included_keyphrases.append(text)
+            else:
+                candidate_weights[text] = candidate_weights.get(text, 0) + weights[slug]
+
+        candidate_keyphrases = list(candidate_weights)
+        if len(candidate_keyphrases) <= 3:
+            suggested_keyphrases = candidate_keyphrases
+        else:
+            suggested_keyphrases = random.choices(
+                candidate_keyphrases,
+                k=3,
+                weights=list(candidate_weights.values()),
+            )
+
+        return included_keyphrases, suggested_keyphrases
+
+
+def suggest_keyphrases(
+    summary: Doc, chunks: list, matcher: KeyphraseMatcher | None = None
+) -> tuple[list[str], list[str]]:
     """Return keyphrases that were included in the summary and suggests
     keyphrases that were not included.
+
+    A keyphrase is included if its lemmas, without stop words, occur in the
+    lemmas of the summary. Pass the page's cached matcher to avoid
+    lemmatizing the keyphrases of every chunk again.
     """
-    included_keyphrases = list()
-    candidate_keyphrases = list()
-    weights = list()
-
-    summary_lemmas = " ".join([t.lemma_.lower() for t in summary if not t.is_stop])
-
-    for chunk in chunks:
-        if not chunk.keyphrases:
-            continue
-
-        for keyphrase in nlp.pipe(chunk.keyphrases):
-            keyphrase_lemmas = [t.lemma_ for t in keyphrase if not t.is_stop]
-            keyphrase_included = re.search(
-                re.escape(r" ".join(keyphrase_lemmas)),
-                summary_lemmas,
-                re.IGNORECASE,
-            )
-            if keyphrase_included:
-                # keyphrase is included in summary
-                included_keyphrases.append(keyphrase.text)
-            elif keyphrase.text in candidate_keyphrases:
-                # keyphrase has already been suggested
-                # increase the weight of this keyphrase suggestion
-                keyphrase_index = candidate_keyphrases.index(keyphrase.text)
-                weights[keyphrase_index] += chunk.weight
-            else:
-                # New keyphrase suggestion
-                candidate_keyphrases.append(keyphrase.text)
-                # weight keyphrase suggestions by inverse focus time
-                weights.append(chunk.weight)
-
-    if len(candidate_keyphrases) <= 3:
-        suggested_keyphrases = candidate_keyphrases
-    else:
-        suggested_keyphrases = random.choices(
-            candidate_keyphrases,
-            k=3,
-            weights=weights,
-        )
-
-    return included_keyphrases, suggested_keyphrases
+    if matcher is None:
+        matcher = KeyphraseMatcher(chunks)
+    return matcher.suggest(summary, {chunk.slug: chunk.weight for chunk in chunks})
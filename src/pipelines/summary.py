@@ -1,12 +1,37 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
 from typing import Dict
 
+import numpy as np
 import torch
+from cachetools import LRUCache
 from transformers import (
     AutoModelForSequenceClassification,
     AutoTokenizer,
     TextClassificationPipeline,
 )
 
+from ..schemas.models import SummaryBenchmarkReport
+from ..utils.inference import summary_pool
+from ..utils.micro_batcher import MicroBatcher
+from ..utils.model_registry import model_registry
+
+logger = logging.getLogger("itell_ai")
+
+# Texts on which the fast tokenizer must reproduce the slow tokenizer's ids
+tokenizer_probes = [
+    "Writing tests is essential in software development.",
+    "  Leading, trailing  and   repeated spaces  ",
+    "Numbers 1,234.56, symbols $%&*() and URLs like https://example.com/a?b=c",
+    "Unicode: café, naïve, — “quotes”, ½ and emoji 😀",
+    "Line\nbreaks\tand tabs\r\n",
+    "Contractions don't, won't, it's and we'll.",
+]
+
 
 class SummaryPipeline(TextClassificationPipeline):
     def __init__(self, model, *args, **kwargs):
@@ -22,6 +47,16 @@ class SummaryPipeline(TextClassificationPipeline):
             **kwargs,
         )
 
+    @classmethod
+    def shared(cls, model: str) -> "SummaryPipeline":
+        """The process-wide pipeline for model, loaded on first use."""
+        return model_registry.get(model, lambda: cls(model))
+
+    @classmethod
+    async def ashared(cls, model: str) -> "SummaryPipeline":
+        """shared() for the event loop. The model is loaded in a thread."""
+        return await model_registry.aget(model, lambda: cls(model))
+
     def preprocess(self, input_str: str, **tokenizer_kwargs) -> Dict[str, torch.Tensor]:
         """Only works with a single input, not a list of inputs."""
         input_dict = self.tokenizer(input_str, **tokenizer_kwargs)  # type: ignore
@@ -34,9 +69,166 @@ class SummaryPipeline(TextClassificationPipeline):
 
 
 class LongformerPipeline(SummaryPipeline):
-    def preprocess(self, input_str: str, **tokenizer_kwargs) -> Dict[str, torch.Tensor]:
+    """Scores a summary together with its source, separated by </s>.
+
+    Called with a (summary, source) tuple, the source is tokenized once and
+    its token ids are cached, so each request only tokenizes the summary.
+    The ids are identical to those of the joined "summary</s>source" string.
+
+    ascore batches concurrent requests: up to SUMMARY_BATCH_SIZE requests
+    arriving within SUMMARY_BATCH_WAIT_MS are grouped into buckets of
+    similar length, and each bucket is scored in one padded forward pass.
+    """
+
+    max_batch_size = int(os.getenv("SUMMARY_BATCH_SIZE", 8))
+    max_wait_ms = float(os.getenv("SUMMARY_BATCH_WAIT_MS", 20))
+    bucket_size = 512  # Tokens. Inputs padded to the same bucket share a pass
+
+    def __init__(self, model, *args, **kwargs):
+        super().__init__(model, *args, **kwargs)
+        self.text_tokenizer = self._id_compatible_tokenizer(model)
+        self.source_ids = LRUCache(maxsize=int(os.getenv("PAGE_CACHE_SIZE", 256)))
+        self.lock = threading.Lock()
+        self.batcher = MicroBatcher(
+            self.ascore_batch,
+            self.max_batch_size,
+            self.max_wait_ms / 1000,
+            max_queue=summary_pool.max_queue,
+            name=summary_pool.name,
+        )
+
+    def _id_compatible_tokenizer(self, model: str):
+        """The fast tokenizer of model, if it gives the same ids as the slow
+        tokenizer on the probe texts. Otherwise the slow tokenizer."""
+        try:
+            fast_tokenizer = AutoTokenizer.from_pretrained(model, use_fast=True)
+        except Exception as error:
+            logger.warning(f"No fast tokenizer for {model}: {error!r}")
+            return self.tokenizer
+        if not fast_tokenizer.is_fast:
+            return self.tokenizer
+
+        for probe in tokenizer_probes:
+            slow_ids = self.tokenizer(probe, add_special_tokens=False)["input_ids"]
+            fast_ids = fast_tokenizer(probe, add_special_tokens=False)["input_ids"]
+            if slow_ids != fast_ids:
+                logger.warning(f"Fast tokenizer for {model} differs, using slow")
+                return self.tokenizer
+        return fast_tokenizer
+
+    def token_ids(self, text: str) -> np.ndarray:
+        ids = self.text_tokenizer(text, add_special_tokens=False)["input_ids"]
+        return np.asarray(ids, dtype=np.int64)
+
+    def source_token_ids(self, source: str) -> np.ndarray:
+        """Token ids of a source text, cached by its hash. The source of a
+        page only changes with its revision, so this is a cache per page."""
+        key = hashlib.sha256(source.encode()).hexdigest()
+        with self.lock:
+            ids = self.source_ids.get(key)
+        if ids is None:
+            ids = self.token_ids(source)
+            with self.lock:
+                self.source_ids[key] = ids
+        return ids
+
+    def score(self, summary: str, source: str) -> float:
+        """The score of the summary, with the source's token ids cached."""
+        return float(self((summary, source))["score"])
+
+    async def ascore(self, summary: str, source: str) -> float:
+        """score, batched with concurrent requests and run in the summary
+        scoring inference pool."""
+        return (await self.batcher.submit([(summary, source)]))[0]
+
+    async def ascore_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        return await summary_pool.run(self.score_batch, pairs)
+
+    def score_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        """Scores (summary, source) pairs. Pairs are grouped by length
+        bucket, and each bucket is padded once and scored in one forward
+        pass. Scores are returned in the order of pairs."""
+        encoded = [self.preprocess(pair, **self._preprocess_params) for pair in pairs]
+
+        buckets: dict[int, list[int]] = {}
+        for n, inputs in enumerate(encoded):
+            length = inputs["input_ids"].shape[1]
+            buckets.setdefault(-(-length // self.bucket_size), []).append(n)
+
+        scores = [0.0] * len(pairs)
+        for rows in buckets.values():
+            batch = self._pad([encoded[n] for n in rows])
+            with torch.no_grad():
+                logits = self.model(**batch).logits
+            # As postprocess with function_to_apply="None": the top logit
+            for n, score in zip(rows, logits.max(dim=-1).values.tolist()):
+                scores[n] = score
+        return scores
+
+    def _pad(self, rows: list[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        """Right-pads preprocessed single inputs into one batch on the device.
+        Padding is excluded by the attention masks."""
+        length = max(row["input_ids"].shape[1] for row in rows)
+        pad_values = {"input_ids": self.tokenizer.pad_token_id}
+
+        batch = {}
+        for key in rows[0]:
+            batch[key] = torch.full(
+                (len(rows), length), pad_values.get(key, 0), dtype=torch.long
+            )
+            for n, row in enumerate(rows):
+                batch[key][n, : row[key].shape[1]] = row[key][0]
+        return {key: value.to(self.device) for key, value in batch.items()}
+
+    async def benchmark(
+        self, concurrency_levels: tuple[int, ...] = (1, 4, 16), n_requests: int = 32
+    ) -> list[SummaryBenchmarkReport]:
+        """Throughput and latency of ascore with n_requests summaries of one
+        page, sent by the given numbers of concurrent callers."""
+        source = "Reading comprehension depends on background knowledge. " * 300
+
+        reports = []
+        for concurrency in concurrency_levels:
+            batcher = MicroBatcher(
+                self.ascore_batch, self.max_batch_size, self.max_wait_ms / 1000
+            )
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+
+            async def request(n: int) -> None:
+                async with semaphore:
+                    start = time.perf_counter()
+                    summary = f"Summary {n} says that reading needs knowledge."
+                    await batcher.submit([(summary, source)])
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            try:
+                await asyncio.gather(*[request(n) for n in range(n_requests)])
+            finally:
+                await batcher.close()
+            elapsed = time.perf_counter() - start
+
+            reports.append(
+                SummaryBenchmarkReport(
+                    concurrency=concurrency,
+                    requests=n_requests,
+                    throughput=n_requests / elapsed,
+                    mean_latency_ms=float(np.mean(latencies)) * 1000,
+                    p95_latency_ms=float(np.percentile(latencies, 95)) * 1000,
+                    mean_batch_size=batcher.mean_batch_size,
+                )
+            )
+        return reports
+
+    def preprocess(
+        self, inputs: str | tuple[str, str], **tokenizer_kwargs
+    ) -> Dict[str, torch.Tensor]:
         """Only works with a single input, not a list of inputs."""
-        input_dict = self.tokenizer(input_str, **tokenizer_kwargs)  # type: ignore
+        if not isinstance(inputs, str):
+            return self._preprocess_pair(*inputs, **tokenizer_kwargs)
+
+        input_dict = self.tokenizer(inputs, **tokenizer_kwargs)  # type: ignore
 
         input_ids = input_dict["input_ids"]
         if not isinstance(input_ids, list):
@@ -49,3 +241,28 @@ class LongformerPipeline(SummaryPipeline):
         )
 
         return {k: torch.tensor([v]) for k, v in input_dict.items()}
+
+    def _preprocess_pair(
+        self, summary: str, source: str, truncation=False, max_length=None, **_
+    ) -> Dict[str, torch.Tensor]:
+        """Joins the ids of summary and source as the tokenizer would for
+        summary + "</s>" + source, including its truncation from the right."""
+        cls_id = self.tokenizer.cls_token_id
+        sep_id = self.tokenizer.sep_token_id
+
+        ids = np.concatenate(
+            [self.token_ids(summary), [sep_id], self.source_token_ids(source)]
+        )
+        if truncation and max_length is not None:
+            ids = ids[: max_length - self.tokenizer.num_special_tokens_to_add()]
+        input_ids = torch.from_numpy(np.concatenate([[cls_id], ids, [sep_id]]))
+
+        # Global attention up to and including the first separator
+        sep_index = int(torch.argmax((input_ids == sep_id).long()))
+        global_attention_mask = (torch.arange(len(input_ids)) <= sep_index).long()
+
+        return {
+            "input_ids": input_ids[None],
+            "attention_mask": torch.ones_like(input_ids)[None],
+            "global_attention_mask": global_attention_mask[None],
+        }
@@ -1,8 +1,30 @@
-from fastapi import APIRouter, Request, Response
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request, Response
 
-from ..services.api_keys import create_new_api_key, delete_api_key
-from ..schemas.api_keys import CreateAPIKeyInput, DeleteAPIKeyInput
 from ..logging.logging_router import LoggingRoute
+from ..pipelines.containment import benchmark_containment
+from ..pipelines.embed import EmbeddingPipeline
+from ..pipelines.nlp import nlp
+from ..pipelines.summary import LongformerPipeline
+from ..schemas.api_keys import CreateAPIKeyInput, DeleteAPIKeyInput
+from ..schemas.cache import CacheStats
+from ..schemas.embedding import IndexBackendReport, IndexJob, RelevanceShadowStats
+from ..schemas.models import (
+    EmbeddingBackendReport,
+    EmbeddingBenchmarkReport,
+    ModelStats,
+    SummaryBenchmarkReport,
+)
+from ..schemas.summary import ContainmentBenchmarkReport, StageStats
+from ..services.api_keys import create_new_api_key, delete_api_key
+from ..services.page_analysis import page_analysis_cache
+from ..services.relevance import shadow_stats
+from ..services.summary_cache import summary_score_cache
+from ..services.summary_eval import content_model, summary_stages
+from ..utils.embedding_cache import embedding_cache
+from ..utils.inference import embedding_pool, spacy_pool
+from ..utils.model_registry import model_registry
 
 router = APIRouter(route_class=LoggingRoute)
 
@@ -25,3 +47,101 @@ async def delete_api_key_endpoint(
     """Deletes an API key for the Content Management System."""
     supabase = request.app.state.supabase
     return await delete_api_key(input_body, supabase)
+
+
+@router.post("/rebuild/index", status_code=202)
+async def rebuild_index(request: Request) -> IndexJob:
+    """Rebuilds the FAISS index from the full vector store in the background.
+    Embedding writes update the index incrementally, so this is only needed
+    if the vector store was modified outside of the API.
+    The current index is served until the rebuilt one replaces it."""
+    faiss = request.app.state.faiss
+    return faiss.submit_rebuild()
+
+
+@router.get("/index/jobs/{job_id}")
+async def index_job(job_id: str, request: Request) -> IndexJob:
+    """Returns the status of a FAISS index job."""
+    faiss = request.app.state.faiss
+    job = faiss.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Index job {job_id} not found")
+    return job
+
+
+@router.post("/benchmark/index")
+async def benchmark_index(request: Request) -> list[IndexBackendReport]:
+    """Reports recall and latency of each FAISS backend
+    compared to exact search on the current corpus."""
+    faiss = request.app.state.faiss
+    # Builds every index type, so it runs in a thread
+    return await asyncio.to_thread(faiss.benchmark_backends)
+
+
+@router.post("/benchmark/embedding")
+async def benchmark_embedding() -> list[EmbeddingBenchmarkReport]:
+    """Reports embedding throughput with and without micro-batching
+    of concurrent requests."""
+    pipeline = await EmbeddingPipeline.ashared()
+    return await pipeline.benchmark()
+
+
+@router.post("/benchmark/embedding/backends")
+async def benchmark_embedding_backends() -> list[EmbeddingBackendReport]:
+    """Reports the latency of the PyTorch and quantized ONNX Runtime
+    embedding backends, and how closely their embeddings agree."""
+    pipeline = await EmbeddingPipeline.ashared()
+    return await embedding_pool.run(pipeline.compare_backends)
+
+
+@router.post("/benchmark/summary")
+async def benchmark_summary() -> list[SummaryBenchmarkReport]:
+    """Reports summary content scoring throughput and latency
+    at several levels of concurrency, with requests batched."""
+    content_pipe = await LongformerPipeline.ashared(content_model)
+    return await content_pipe.benchmark()
+
+
+@router.post("/benchmark/containment")
+async def benchmark_containment_scoring() -> list[ContainmentBenchmarkReport]:
+    """Reports the latency of containment scoring with and without the
+    precomputed trigram hashes of the page, for pages of 1k to 50k tokens."""
+    return await spacy_pool.run(benchmark_containment, nlp.vocab)
+
+
+@router.post("/stats/embedding_cache")
+async def embedding_cache_stats() -> CacheStats:
+    """Reports hits and misses of the process-wide embedding cache."""
+    return embedding_cache.stats()
+
+
+@router.post("/stats/page_cache")
+async def page_cache_stats() -> CacheStats:
+    """Reports hits and misses of the cache of parsed source pages."""
+    return page_analysis_cache.stats()
+
+
+@router.post("/stats/summary_cache")
+async def summary_cache_stats() -> CacheStats:
+    """Reports hits and misses of the cache of summary scores."""
+    return summary_score_cache.stats()
+
+
+@router.post("/stats/relevance")
+async def relevance_stats() -> RelevanceShadowStats:
+    """Reports the divergence between the Supabase and FAISS page similarities
+    observed in shadow mode."""
+    return shadow_stats()
+
+
+@router.post("/stats/summary_stages")
+async def summary_stage_stats() -> list[StageStats]:
+    """Reports how often each summary scoring stage ran or was skipped
+    because the summary had already failed the junk filter."""
+    return summary_stages.stats()
+
+
+@router.post("/stats/models")
+async def model_stats() -> list[ModelStats]:
+    """Reports the memory held by each model loaded in this process."""
+    return model_registry.report()
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi import APIRouter, HTTPException, Request
 
 from ..logging.logging_router import LoggingRoute
 from ..schemas.embedding import (
+    BatchRetrievalInput,
+    BatchRetrievalResults,
     ChunkInput,
     DeleteUnusedInput,
+    EmbeddingResults,
+    IndexJob,
+    PageEmbeddingInput,
     RetrievalInput,
     RetrievalResults,
 )
@@ -32,20 +37,47 @@ async def generate_transcript(input_body: TranscriptInput) -> TranscriptResults:
     return await transcript_generate(input_body)
 
 
-@router.post("/generate/embedding")
+@router.post("/generate/embedding", status_code=201)
 async def generate_embedding(
     input_body: ChunkInput,
     request: Request,
-) -> Response:
+) -> EmbeddingResults:
     """This endpoint generates an embedding for a provided chunk of text
     and saves it to the vector store on SupaBase.
     It is only intended to be called by the Content Management System.
+
+    A chunk stored with the same content is skipped.
+    Otherwise, the FAISS index is updated in the background. The returned
+    job can be polled at /index/jobs/{job_id}.
     """
     supabase = request.app.state.supabase
     faiss = request.app.state.faiss
-    response = await supabase.embedding_generate(input_body)
-    await faiss.create_faiss_index()
-    return response
+    upserted, skipped = await supabase.embedding_generate(input_body)
+    job = faiss.submit_upsert(upserted) if upserted else None
+    return EmbeddingResults(upserted=upserted, skipped=skipped, job=job)
+
+
+@router.post("/generate/embeddings/page", status_code=201)
+async def generate_page_embeddings(
+    input_body: PageEmbeddingInput,
+    request: Request,
+) -> EmbeddingResults:
+    """Generates embeddings for all chunks of a page in one request and
+    saves them to the vector store with one bulk upsert. Chunks stored with
+    the same content are skipped. If chunk_slugs is given, stale chunks of
+    the page are deleted as in /delete/embedding.
+    It is only intended to be called by the Content Management System.
+
+    The FAISS index is updated for the whole page by one background job.
+    """
+    supabase = request.app.state.supabase
+    faiss = request.app.state.faiss
+    upserted, skipped, deleted = await supabase.page_embeddings_generate(input_body)
+    # Upserting a chunk without a row removes it from the index
+    job = faiss.submit_upsert(upserted + deleted) if upserted or deleted else None
+    return EmbeddingResults(
+        upserted=upserted, skipped=skipped, deleted=deleted, job=job
+    )
 
 
 @router.post("/retrieve/chunks")
@@ -57,16 +89,28 @@ async def retrieve_chunks(
     return await faiss.retrieve_chunks(input_body)
 
 
-@router.post("/delete/embedding")
+@router.post("/retrieve/chunks/batch")
+async def retrieve_chunks_batch(
+    input_body: BatchRetrievalInput,
+    request: Request,
+) -> BatchRetrievalResults:
+    """Retrieves chunks for many queries in a single request.
+    Results are returned in the same order as the queries."""
+    faiss = request.app.state.faiss
+    results = await faiss.retrieve_chunks_batch(input_body.queries)
+    return BatchRetrievalResults(results=results)
+
+
+@router.post("/delete/embedding", status_code=202)
 async def delete_unused_chunks(
     input_body: DeleteUnusedInput,
     request: Request,
-) -> Response:
+) -> IndexJob:
     """This endpoint accepts a list of slugs of chunks currently in STRAPI.
     It deletes any embeddings in the vector store that are not in the list.
+    The FAISS index is updated in the background.
     """
     faiss = request.app.state.faiss
     supabase = request.app.state.supabase
-    response = await supabase.delete_unused(input_body)
-    await faiss.create_faiss_index()
-    return response
+    await supabase.delete_unused(input_body)
+    return faiss.submit_remove_unused(input_body)
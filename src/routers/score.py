@@ -1,6 +1,6 @@
 from typing import AsyncGenerator
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, BackgroundTasks, Request, Response
 from fastapi.responses import StreamingResponse
 
 from ..logging.logging_router import LoggingRoute, LoggingStreamingResponse
@@ -24,6 +24,8 @@ router = APIRouter(route_class=LoggingRoute)
 async def score_summary(
     input_body: SummaryInputStrapi,
     request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
 ) -> SummaryResultsWithFeedback:
     """Score a summary.
     Requires a page_slug.
@@ -31,7 +33,10 @@ async def score_summary(
     strapi = request.app.state.strapi
     supabase = request.app.state.supabase
     faiss = request.app.state.faiss
-    _, results = await summary_score(input_body, strapi, supabase, faiss)
+    summary, results = await summary_score(
+        input_body, strapi, supabase, faiss, background_tasks
+    )
+    response.headers["Server-Timing"] = summary.timings.server_timing()
     feedback: SummaryResultsWithFeedback = summary_feedback(results)
     return feedback
 
@@ -52,6 +57,7 @@ async def score_answer(
 async def score_summary_with_stairs(
     input_body: SummaryInputStrapi,
     request: Request,
+    background_tasks: BackgroundTasks,
 ) -> StreamingResponse:
     """Scores a summary. If the summary fails, selects a chunk for re-reading and
     generates a self-explanation (SERT) question about the chunk.
@@ -69,7 +75,9 @@ async def score_summary_with_stairs(
     supabase = request.app.state.supabase
     faiss = request.app.state.faiss
 
-    summary, results = await summary_score(input_body, strapi, supabase, faiss)
+    summary, results = await summary_score(
+        input_body, strapi, supabase, faiss, background_tasks
+    )
 
     feedback: SummaryResultsWithFeedback = summary_feedback(results)
 
@@ -87,7 +95,9 @@ async def score_summary_with_stairs(
                 yield chunk
 
     return LoggingStreamingResponse(
-        content=stream_results(), media_type="text/event-stream"
+        content=stream_results(),
+        media_type="text/event-stream",
+        headers={"Server-Timing": summary.timings.server_timing()},
     )
 
 @router.post("/score/summary/test", response_model=StreamingSummaryResults)
@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import List, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ChunkInput(BaseModel):
@@ -13,20 +13,123 @@ class ChunkInput(BaseModel):
     content: str  # Chunk text content
 
 
+class PageChunkInput(BaseModel):
+    chunk_slug: str
+    content: str  # Chunk text content
+
+
+class PageEmbeddingInput(BaseModel):
+    text_slug: str
+    module_slug: Optional[str] = None
+    chapter_slug: Optional[str] = None
+    page_slug: str
+    chunks: list[PageChunkInput]
+    chunk_slugs: Optional[list[str]] = Field(
+        default=None,
+        description=(
+            "Slugs of the page's chunks currently in the CMS, as in DeleteUnusedInput."
+            " Stored chunks of the page that are in neither this list nor chunks"
+            " are deleted. If omitted, no chunks are deleted."
+        ),
+    )
+
+
 class RetrievalStrategy(str, Enum):
     most_similar = "most_similar"
     least_similar = "least_similar"
 
 
+class IndexBackend(str, Enum):
+    cpu_flat = "cpu_flat"
+    cpu_hnsw = "cpu_hnsw"
+    cpu_ivf = "cpu_ivf"
+    gpu_flat = "gpu_flat"
+
+
+class IndexJobKind(str, Enum):
+    rebuild = "rebuild"
+    upsert = "upsert"
+    remove_unused = "remove_unused"
+
+
+class IndexJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class IndexJob(BaseModel):
+    """A write to the FAISS index, applied by a background worker."""
+
+    job_id: str
+    kind: IndexJobKind
+    status: IndexJobStatus = IndexJobStatus.queued
+    index_version: Optional[int] = Field(
+        default=None,
+        description="Version of the first index snapshot that includes the job.",
+    )
+    error: Optional[str] = None
+
+
+class EmbeddingResults(BaseModel):
+    upserted: list[str]
+    skipped: list[str] = Field(
+        description="Chunks stored with the same content, which were not re-embedded."
+    )
+    deleted: list[str] = []
+    job: Optional[IndexJob] = Field(
+        default=None,
+        description="The FAISS index update, if any chunk was upserted or deleted.",
+    )
+
+
+class RelevanceBackend(str, Enum):
+    faiss = "faiss"
+    supabase = "supabase"
+    shadow = "shadow"
+
+
+class RelevanceShadowStats(BaseModel):
+    """Divergence between the Supabase and FAISS page similarities,
+    over the requests sampled in shadow mode."""
+
+    backend: RelevanceBackend
+    sample_rate: float
+    comparisons: int
+    errors: int
+    mean_abs_diff: float
+    max_abs_diff: float
+
+
+class IndexBackendReport(BaseModel):
+    """Recall and latency of an index backend compared to exact search."""
+
+    backend: IndexBackend
+    ntotal: int
+    k: int
+    recall: float
+    latency_ms: float  # mean single-query search latency
+    build_time_ms: float
+
+
 class RetrievalInput(BaseModel, use_enum_values=True):
     text_slug: Optional[str] = None
     page_slugs: list[str]
+    all_pages: bool = Field(
+        default=False,
+        description="Search every page instead of page_slugs.",
+    )
     text: str  # text to compare to (student summary)
     similarity_threshold: Optional[float] = 0.0
     retrieve_strategy: Optional[RetrievalStrategy] = RetrievalStrategy.most_similar
     match_count: Optional[int] = 1
 
 
+class BatchRetrievalInput(BaseModel):
+    queries: list[RetrievalInput]
+
+
 class Match(BaseModel):
     page: str
     chunk: str
@@ -54,6 +157,12 @@ class RetrievalResults(BaseModel):
     matches: List[Match] = []
 
 
+class BatchRetrievalResults(BaseModel):
+    results: list[RetrievalResults] = Field(
+        description="One result per query, in request order."
+    )
+
+
 class DeleteUnusedInput(BaseModel):
     page_slug: str
     chunk_slugs: list[str]
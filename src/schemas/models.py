@@ -0,0 +1,47 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class EmbeddingBackend(str, Enum):
+    torch = "torch"
+    onnx = "onnx"
+
+
+class ModelStats(BaseModel):
+    name: str
+    resident_bytes: int = Field(
+        description="Memory held by the model's parameters and buffers."
+    )
+    load_time_ms: float
+
+
+class EmbeddingBenchmarkReport(BaseModel):
+    """Embedding throughput with or without micro-batching."""
+
+    mode: str
+    requests: int
+    throughput: float = Field(description="Requests per second.")
+    mean_batch_size: float
+
+
+class EmbeddingBackendReport(BaseModel):
+    """Latency and parity of an embedding backend."""
+
+    backend: EmbeddingBackend
+    latency_ms: float = Field(description="Mean latency of a single text.")
+    batch_latency_ms: float = Field(description="Mean latency of a batch.")
+    min_cosine: float = Field(
+        description="Lowest cosine similarity to the configured backend's embeddings."
+    )
+
+
+class SummaryBenchmarkReport(BaseModel):
+    """Summary scoring throughput and latency at a level of concurrency."""
+
+    concurrency: int
+    requests: int
+    throughput: float = Field(description="Requests per second.")
+    mean_latency_ms: float
+    p95_latency_ms: float
+    mean_batch_size: float
@@ -1,13 +1,18 @@
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Literal, Optional, Union
+from typing import TYPE_CHECKING, Literal, Optional, Union
 
+import numpy as np
 from pydantic import BaseModel, ConfigDict, Field
 from spacy.tokens import Doc
 
 from .chat import ChatMessage
 from .strapi import Chunk
 
+if TYPE_CHECKING:
+    from ..pipelines.keyphrases import KeyphraseMatcher
+    from ..utils.stage_timings import StageTimings
+
 
 class SummaryInputStrapi(BaseModel):
     page_slug: str = Field(
@@ -54,6 +59,20 @@ class SummaryInputTest(SummaryInputStrapi):
     )
 
 
+class ContainmentBenchmarkReport(BaseModel):
+    """Latency of containment scoring against a page of page_tokens tokens."""
+
+    page_tokens: int
+    sets_ms: float = Field(description="Mean latency with Python sets of trigrams.")
+    hashed_ms: float = Field(
+        description="Mean latency with the page's precomputed trigram hashes."
+    )
+    index_build_ms: float = Field(
+        description="Time to hash the page's trigrams, paid once per page revision."
+    )
+    matches: bool = Field(description="Whether both methods gave identical scores.")
+
+
 class SummaryScoreResults(BaseModel):
     """Intermediate Object for Storing Summary Scores"""
 
@@ -68,6 +87,17 @@ class SummaryScoreResults(BaseModel):
     content_threshold: Optional[float] = None
 
 
+class StageStats(BaseModel):
+    """How often a summary scoring stage ran or was skipped, and its mean
+    duration when it ran."""
+
+    name: str
+    cost: int
+    runs: int
+    skips: int
+    mean_ms: float
+
+
 class ScoreType(str, Enum):
     containment = "Language Borrowing"
     containment_chat = "Language Borrowing (from iTELL AI)"
@@ -182,8 +212,13 @@ class Summary:
 
     summary: Doc
     source: Doc
+    source_trigrams: np.ndarray  # trigram_hashes of the source
     chunks: list[ChunkWithWeight]
     page_slug: str
     chat_history: Optional[list[ChatMessage]] = None
     bot_messages: Optional[Doc] = None
     excluded_chunks: list[str] = field(default_factory=lambda: [])
+    embedding: Optional[list[float]] = None
+    keyphrase_matcher: Optional["KeyphraseMatcher"] = None  # Cached for the page
+    page_key: Optional[str] = None  # Page slug and revision
+    timings: Optional["StageTimings"] = None
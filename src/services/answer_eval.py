@@ -4,11 +4,10 @@ from transformers import logging
 from ..dependencies.strapi import Strapi
 from ..pipelines.answer import AnswerPipeline
 from ..schemas.answer import AnswerInputStrapi, AnswerResults
+from ..utils.inference import answer_pool
 
 logging.set_verbosity_error()
 
-answer_pipe = AnswerPipeline()
-
 
 class Answer:
     def __init__(self, gold_answer: str, answer: str) -> None:
@@ -20,7 +19,7 @@ class Answer:
         """
         Returns passing score ONLY if both BLEURT and MPnet agree that it is passing
         """
-        res = answer_pipe(self.answer, self.gold)
+        res = AnswerPipeline.shared()(self.answer, self.gold)
 
         self.results["score"] = res
         if res < 2:
@@ -41,6 +40,6 @@ async def answer_score(
         )
 
     answer = Answer(chunk.constructed_response, answer_input.answer)
-    answer.score_answer()
+    await answer_pool.run(answer.score_answer)
 
     return AnswerResults(**answer.results)
@@ -0,0 +1,127 @@
+"""
+A cache of parsed source pages for summary scoring.
+The page text is the same for every student, so each revision of a page is
+parsed once and summary requests only parse the summary itself.
+"""
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from cachetools import LRUCache
+from spacy.tokens import Doc, DocBin
+
+from ..pipelines.containment import trigram_hashes
+from ..pipelines.keyphrases import KeyphraseMatcher
+from ..pipelines.nlp import nlp
+from ..schemas.cache import CacheStats
+from ..schemas.strapi import PageWithContent
+from ..utils.inference import spacy_pool
+
+
+@dataclass(frozen=True)
+class PageAnalysis:
+    """Parsed chunks of a page revision. Shared between requests, so the
+    docs must not be modified."""
+
+    chunk_docs: list[Doc]
+    token_counts: list[int]
+    source: Doc  # All chunks combined into a single doc
+    source_trigrams: np.ndarray  # trigram_hashes of the source
+    keyphrase_matcher: KeyphraseMatcher
+
+
+class PageAnalysisCache:
+    """LRU cache of page analyses keyed by page slug and Strapi updatedAt,
+    so a page is parsed again once it is republished.
+
+    If cache_dir is set, the parsed chunks are also saved there as a spaCy
+    DocBin, so they survive restarts and are shared between replicas that
+    mount the same directory.
+    """
+
+    def __init__(self, maxsize: int, cache_dir: Optional[Path] = None) -> None:
+        self.cache = LRUCache(maxsize=maxsize)
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(page: PageWithContent) -> str:
+        return f"{page.slug}@{page.updated_at.isoformat()}"
+
+    async def get(self, page: PageWithContent) -> PageAnalysis:
+        """Returns the analysis of the page, parsing it if needed."""
+        key = self.key(page)
+        with self.lock:
+            analysis = self.cache.get(key)
+            if analysis is not None:
+                self.hits += 1
+                return analysis
+            self.misses += 1
+
+        # Parsing and deserializing both add strings to the shared vocabulary,
+        # so they run in the spaCy pool
+        analysis = await spacy_pool.run(self._analyze, key, page)
+        with self.lock:
+            self.cache[key] = analysis
+        return analysis
+
+    def _analyze(self, key: str, page: PageWithContent) -> PageAnalysis:
+        chunk_docs = self._load(key)
+        if chunk_docs is None:
+            chunk_docs = list(
+                nlp.pipe(
+                    [chunk.header + "\n" + chunk.clean_text for chunk in page.content]
+                )
+            )
+            self._save(key, chunk_docs)
+
+        source = Doc.from_docs(chunk_docs)
+        return PageAnalysis(
+            chunk_docs=chunk_docs,
+            token_counts=[len(doc) for doc in chunk_docs],
+            source=source,
+            source_trigrams=trigram_hashes(source),
+            keyphrase_matcher=KeyphraseMatcher(page.content),
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(key.encode()).hexdigest()}.spacy"
+
+    def _load(self, key: str) -> Optional[list[Doc]]:
+        if self.cache_dir is None or not self._path(key).exists():
+            return None
+        doc_bin = DocBin().from_bytes(self._path(key).read_bytes())
+        return list(doc_bin.get_docs(nlp.vocab))
+
+    def _save(self, key: str, chunk_docs: list[Doc]) -> None:
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Write to a temporary file so that other replicas never read a partial file
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp_path.write_bytes(DocBin(docs=chunk_docs).to_bytes())
+        os.replace(tmp_path, path)
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self.cache),
+                maxsize=int(self.cache.maxsize),
+            )
+
+
+page_cache_dir = os.getenv("PAGE_CACHE_DIR")
+page_analysis_cache = PageAnalysisCache(
+    maxsize=int(os.getenv("PAGE_CACHE_SIZE", 256)),
+    cache_dir=Path(page_cache_dir).expanduser() if page_cache_dir else None,
+)
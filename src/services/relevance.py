@@ -0,0 +1,114 @@
+"""
+Page similarity of a summary, used to check that it is relevant to the source.
+
+RELEVANCE_BACKEND selects where the similarity comes from:
+- supabase: the page_similarity RPC (default).
+- faiss: the in-memory page centroids of FAISS_Wrapper.
+- shadow: Supabase is used for the score. On a RELEVANCE_SHADOW_RATE fraction
+  of requests, FAISS is queried in the background and the difference is logged.
+"""
+
+import asyncio
+import logging
+import os
+import random
+
+from fastapi import HTTPException
+
+from ..dependencies.faiss import FAISS_Wrapper
+from ..dependencies.supabase import SupabaseClient
+from ..schemas.embedding import RelevanceBackend, RelevanceShadowStats
+
+logger = logging.getLogger("itell_ai")
+
+
+class ShadowComparison:
+    """Running divergence statistics between the two backends."""
+
+    def __init__(self) -> None:
+        self.comparisons = 0
+        self.errors = 0
+        self.total_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+        # Keep references to pending comparisons so they are not garbage collected
+        self.tasks: set[asyncio.Task] = set()
+
+    def record(self, primary: float, secondary: float) -> float:
+        abs_diff = abs(primary - secondary)
+        self.comparisons += 1
+        self.total_abs_diff += abs_diff
+        self.max_abs_diff = max(self.max_abs_diff, abs_diff)
+        return abs_diff
+
+    @property
+    def mean_abs_diff(self) -> float:
+        return self.total_abs_diff / self.comparisons if self.comparisons else 0.0
+
+
+backend = RelevanceBackend(os.getenv("RELEVANCE_BACKEND", RelevanceBackend.supabase))
+shadow_rate = float(os.getenv("RELEVANCE_SHADOW_RATE", 0.1))
+shadow = ShadowComparison()
+
+
+async def compare_with_faiss(
+    primary: float, embedding: list[float], page_slug: str, faiss: FAISS_Wrapper
+) -> None:
+    """Computes the FAISS similarity and logs its difference from Supabase."""
+    try:
+        secondary = await faiss.page_similarity(embedding, page_slug)
+    except Exception as error:
+        shadow.errors += 1
+        logger.error(f"Shadow page similarity failed for {page_slug}: {error!r}")
+        return
+
+    abs_diff = shadow.record(primary, secondary)
+    logger.info(
+        "Shadow page similarity",
+        extra={
+            "page_slug": page_slug,
+            "supabase_similarity": primary,
+            "faiss_similarity": secondary,
+            "abs_diff": abs_diff,
+            "mean_abs_diff": shadow.mean_abs_diff,
+            "max_abs_diff": shadow.max_abs_diff,
+            "comparisons": shadow.comparisons,
+        },
+    )
+
+
+async def page_similarity(
+    embedding: list[float],
+    page_slug: str,
+    supabase: SupabaseClient,
+    faiss: FAISS_Wrapper,
+) -> float:
+    """Returns the similarity between the embedding and the target page
+    from the configured backend."""
+    if backend == RelevanceBackend.faiss:
+        similarity = await faiss.page_similarity(embedding, page_slug)
+        if similarity == -100.0:
+            message = f"Page similarity not found for {page_slug}"
+            raise HTTPException(status_code=404, detail=message)
+        return similarity
+
+    similarity = await supabase.page_similarity(embedding, page_slug)
+
+    if backend == RelevanceBackend.shadow and random.random() < shadow_rate:
+        task = asyncio.create_task(
+            compare_with_faiss(similarity, embedding, page_slug, faiss)
+        )
+        shadow.tasks.add(task)
+        task.add_done_callback(shadow.tasks.discard)
+
+    return similarity
+
+
+def shadow_stats() -> RelevanceShadowStats:
+    return RelevanceShadowStats(
+        backend=backend,
+        sample_rate=shadow_rate,
+        comparisons=shadow.comparisons,
+        errors=shadow.errors,
+        mean_abs_diff=shadow.mean_abs_diff,
+        max_abs_diff=shadow.max_abs_diff,
+    )
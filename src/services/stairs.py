@@ -51,7 +51,8 @@ async def select_chunk(
             text=summary.summary.text,
             retrieve_strategy=RetrievalStrategy.least_similar,
             match_count=10,
-        )
+        ),
+        embedding=summary.embedding,
     )
 
     if len(least_similar_chunks.matches) == 0:
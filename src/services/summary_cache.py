@@ -0,0 +1,104 @@
+"""
+An opt-in cache of summary scores. Students often resubmit the same summary
+(double-clicks, retries, revisiting a page), and a resubmission returns the
+scores of the first submission without scoring the summary or updating the
+volume prior again.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from cachetools import TTLCache
+
+from ..schemas.cache import CacheStats
+from ..schemas.summary import SummaryInputStrapi, SummaryScoreResults
+
+
+@dataclass(frozen=True)
+class CachedScore:
+    results: SummaryScoreResults
+    embedding: Optional[list[float]]  # Reused for STAIRS chunk selection
+
+
+class SummaryScoreCache:
+    """TTL cache of summary scores keyed by a hash of the page revision and
+    the parts of the request that affect the scores. Identical requests that
+    arrive while the first one is being scored wait for its scores.
+
+    Disabled if maxsize is 0. Only used from the event loop, so no lock.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.cache = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self.pending: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    @staticmethod
+    def key(summary_input: SummaryInputStrapi, page_key: str) -> str:
+        """Hash of the page revision, the summary with whitespace normalized,
+        the chat history and the score history."""
+        request = {
+            "page": page_key,
+            "summary": " ".join(summary_input.summary.split()),
+            "chat_history": [
+                [message.agent, message.text] for message in summary_input.chat_history
+            ],
+            "score_history": summary_input.score_history,
+        }
+        return hashlib.sha256(json.dumps(request).encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[CachedScore]:
+        """Returns the cached score, waiting for an identical request that is
+        being scored. On a miss, the caller must call put with its score, or
+        with None if scoring failed."""
+        if not self.enabled:
+            return None
+
+        score = self.cache.get(key)
+        if score is None and key in self.pending:
+            score = await asyncio.shield(self.pending[key])
+        if score is not None:
+            self.hits += 1
+            return score
+
+        self.misses += 1
+        self.pending.setdefault(key, asyncio.get_running_loop().create_future())
+        return None
+
+    def put(self, key: str, score: Optional[CachedScore]) -> None:
+        if not self.enabled:
+            return
+        if score is not None:
+            self.cache[key] = score
+        pending = self.pending.pop(key, None)
+        if pending is not None and not pending.done():
+            pending.set_result(score)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self.cache),
+            maxsize=self.maxsize,
+        )
+
+
+summary_score_cache = SummaryScoreCache(
+    maxsize=int(os.getenv("SUMMARY_CACHE_SIZE", 0)),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", 600)),
+)
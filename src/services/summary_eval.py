@@ -1,5 +1,10 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
 import gcld3
-from spacy.tokens import Doc
+from fastapi import BackgroundTasks
 
 from src.dependencies.faiss import FAISS_Wrapper
 
@@ -13,152 +18,261 @@ from ..pipelines.nlp import nlp
 from ..pipelines.profanity_filter import profanity_filter
 from ..pipelines.summary import LongformerPipeline
 from ..schemas.prior import VolumePrior
-from ..schemas.strapi import Chunk
+from ..schemas.strapi import Chunk, PageWithContent
 from ..schemas.summary import (
     ChunkWithWeight,
     Summary,
     SummaryInputStrapi,
     SummaryScoreResults,
 )
-from ..services.summary_feedback import feedback_processors
+from ..services.page_analysis import PageAnalysis, page_analysis_cache
+from ..services.relevance import page_similarity
+from ..services.summary_cache import CachedScore, summary_score_cache
+from ..services.summary_feedback import fails_junk_filter
+from ..utils.inference import spacy_pool
+from ..utils.stage_pipeline import Stage, StagePipeline, cancel_pending
+from ..utils.stage_timings import StageTimings
+
+logger = logging.getLogger("itell_ai")
 
-content_pipe = LongformerPipeline("tiedaar/longformer-content-global2")
-embedding_pipe = EmbeddingPipeline()
+content_model = "tiedaar/longformer-content-global2"
 detector = gcld3.NNetLanguageIdentifier(  # type: ignore
     min_num_bytes=0, max_num_bytes=1000
 )
 
 
 def weight_chunks(
-    chunks: list[Chunk], chunk_docs: list[Doc], focus_time_dict: dict
+    chunks: list[Chunk], token_counts: list[int], focus_time_dict: dict
 ) -> list[ChunkWithWeight]:
     """Weight chunks based on focus time"""
     weighted_chunks = []
-    for chunk, chunk_doc in zip(chunks, chunk_docs):
+    for chunk, token_count in zip(chunks, token_counts):
         if not chunk.component_type == "page.chunk":
             continue
         focus_time = max(focus_time_dict.get(chunk.slug, 1), 1)
-        weight = 3.33 * (focus_time / len(chunk_doc))
+        weight = 3.33 * (focus_time / token_count)
         weighted_chunks.append(
             ChunkWithWeight(**chunk.model_dump(by_alias=True), weight=weight)
         )
     return weighted_chunks
 
 
-async def prepare_summary(
-    summary_input: SummaryInputStrapi,
-    strapi: Strapi,
-) -> tuple[Summary, SummaryScoreResults]:
-    """Checks summary for text copied from the source and for semantic
-    relevance to the source text. If it passes these checks, score the summary
-    using a Huggingface pipeline.
-    """
+async def analyze_page(
+    page_slug: str, strapi: Strapi
+) -> tuple[PageWithContent, PageAnalysis]:
+    page = await strapi.get_page(page_slug)
+    return page, await page_analysis_cache.get(page)
 
-    # Retrieve chunks from Strapi and weight them
-    # 3.33 words per second is an average reading pace
-    chunks = await strapi.get_chunks(summary_input.page_slug)
 
-    chunk_docs = list(
-        nlp.pipe([chunk.header + "\n" + chunk.clean_text for chunk in chunks])
-    )
+async def summary_similarity(
+    summary_text: str,
+    page_slug: str,
+    supabase: SupabaseClient,
+    faiss: FAISS_Wrapper,
+) -> tuple[list[float], float]:
+    """Returns the summary embedding and its similarity to the page."""
+    pipeline = await EmbeddingPipeline.ashared()
+    summary_embed = await pipeline.aembed([summary_text])
+    summary_embed = summary_embed[0].tolist()
+    similarity = await page_similarity(summary_embed, page_slug, supabase, faiss)
+    return summary_embed, similarity + 0.15
 
-    weighted_chunks = weight_chunks(chunks, chunk_docs, summary_input.focus_time)
 
+async def fetch_volume_prior(
+    page_slug: str, strapi: Strapi, supabase: SupabaseClient
+) -> VolumePrior:
+    volume = await strapi.get_text_meta(page_slug)
+    return await supabase.get_volume_prior(volume.slug)
+
+
+async def prepare_summary(
+    summary_input: SummaryInputStrapi,
+    strapi: Strapi,
+    timings: StageTimings,
+) -> Summary:
+    """Parses the summary and chat history while the page is fetched and
+    analyzed, and combines them into a Summary.
+    """
     bot_messages = None
     if summary_input.chat_history:
         bot_messages = "\n".join(
             [msg.text for msg in summary_input.chat_history if msg.agent == "bot"]
         )
 
+    # The parsed page is cached per revision, so only the summary is parsed here
+    page_task = asyncio.create_task(
+        timings.run("page", analyze_page(summary_input.page_slug, strapi))
+    )
+    try:
+        summary_doc = await timings.run(
+            "parse_summary", spacy_pool.run(nlp, summary_input.summary)
+        )
+        bot_doc = None
+        if bot_messages:
+            bot_doc = await timings.run(
+                "parse_bot_messages", spacy_pool.run(nlp, bot_messages)
+            )
+        page, page_analysis = await page_task
+    finally:
+        cancel_pending([page_task])
+
+    # Weight chunks by focus time
+    # 3.33 words per second is an average reading pace
+    weighted_chunks = weight_chunks(
+        page.content, page_analysis.token_counts, summary_input.focus_time
+    )
+
     # Create summary data object
     summary = Summary(
-        summary=nlp(summary_input.summary),
-        source=Doc.from_docs(chunk_docs),  # combine into a single doc
+        summary=summary_doc,
+        source=page_analysis.source,
+        source_trigrams=page_analysis.source_trigrams,
         chunks=weighted_chunks,
         page_slug=summary_input.page_slug,
         chat_history=summary_input.chat_history,
-        bot_messages=nlp(bot_messages) if bot_messages else None,
+        bot_messages=bot_doc,
         excluded_chunks=(
             summary_input.excluded_chunks if summary_input.excluded_chunks else []
         ),
+        keyphrase_matcher=page_analysis.keyphrase_matcher,
+        page_key=page_analysis_cache.key(page),
+        timings=timings,
     )
 
     return summary
 
 
-async def summary_score(
-    summary_input: SummaryInputStrapi,
-    strapi: Strapi,
-    supabase: SupabaseClient,
-    faiss: FAISS_Wrapper,
-) -> tuple[Summary, SummaryScoreResults]:
-    """Checks summary for text copied from the source and for semantic
-    relevance to the source text. If it passes these checks, score the summary
-    using a Huggingface pipeline.
-    """
+@dataclass
+class SummaryScoring:
+    """The state shared by the stages that score one summary."""
 
-    summary = await prepare_summary(summary_input, strapi)
+    summary_input: SummaryInputStrapi
+    strapi: Strapi
+    supabase: SupabaseClient
+    faiss: FAISS_Wrapper
+    timings: StageTimings
+    results: dict = field(default_factory=dict)
+    summary: Optional[Summary] = None
+    prior: Optional[VolumePrior] = None
+    cache_key: Optional[str] = None
+    cached: Optional[CachedScore] = None
 
-    results = {}
 
-    # Check if summary borrows language from source
-    results["containment"] = score_containment(summary.source, summary.summary)
+async def prepare_stage(scoring: SummaryScoring) -> None:
+    scoring.summary = await prepare_summary(
+        scoring.summary_input, scoring.strapi, scoring.timings
+    )
+
+
+async def cache_stage(scoring: SummaryScoring) -> None:
+    """Look up the scores of an identical earlier request"""
+    if summary_score_cache.enabled:
+        scoring.cache_key = summary_score_cache.key(
+            scoring.summary_input, scoring.summary.page_key
+        )
+        scoring.cached = await summary_score_cache.get(scoring.cache_key)
+
+
+async def english_stage(scoring: SummaryScoring) -> None:
+    """Check if summary is in English"""
+    lang_result = await spacy_pool.run(
+        detector.FindLanguage, text=scoring.summary_input.summary
+    )
+    scoring.results["english"] = not (
+        lang_result.is_reliable and lang_result.language != "en"
+    )
+
 
-    # Check if summary borrows language from chat history
+async def profanity_stage(scoring: SummaryScoring) -> None:
+    """Check if summary contains profanity"""
+    scoring.results["profanity"] = await spacy_pool.run(
+        profanity_filter, scoring.summary.summary
+    )
+
+
+async def containment_stage(scoring: SummaryScoring) -> None:
+    """Check if summary borrows language from source and chat history"""
+    summary = scoring.summary
+    scoring.results["containment"] = score_containment(
+        summary.source_trigrams, summary.summary
+    )
     if summary.bot_messages:
-        results["containment_chat"] = score_containment(
+        scoring.results["containment_chat"] = score_containment(
             summary.bot_messages, summary.summary
         )
 
-    # Check if summary is similar to source text
-    summary_embed = embedding_pipe(summary.summary.text)[0].tolist()
-    results["similarity"] = (
-        await supabase.page_similarity(summary_embed, summary.page_slug) + 0.15
+
+async def similarity_stage(scoring: SummaryScoring) -> None:
+    """Check if summary is similar to source text"""
+    embedding, similarity = await summary_similarity(
+        scoring.summary_input.summary,
+        scoring.summary_input.page_slug,
+        scoring.supabase,
+        scoring.faiss,
     )
+    scoring.summary.embedding = embedding  # Reused for STAIRS chunk selection
+    scoring.results["similarity"] = similarity
 
-    # Trigger the FAISS method to collect errors, but discard the result
-    _ = await faiss.page_similarity(summary_embed, summary.page_slug)
-
-    # Generate keyphrase suggestions
-    included, suggested = suggest_keyphrases(summary.summary, summary.chunks)
-    results["included_keyphrases"] = included
-    results["suggested_keyphrases"] = suggested
-
-    # Check if summary is in English
-    results["english"] = True
-    lang_result = detector.FindLanguage(text=summary_input.summary)
-    if lang_result.is_reliable and lang_result.language != "en":
-        results["english"] = False
-
-    # Check if summary contains profanity
-    results["profanity"] = profanity_filter(summary.summary)
-
-    # Check if summary fails to meet minimum requirements
-    junk_filter = any(
-        feedback.is_passed is False  # Do not trigger filter on None values
-        for feedback in [
-            feedback_processors["containment"](results["containment"]),
-            feedback_processors["containment_chat"](
-                results.get("containment_chat", 0.0)
-            ),
-            feedback_processors["similarity"](results["similarity"]),
-            feedback_processors["english"](results["english"]),
-            feedback_processors["profanity"](results["profanity"]),
-        ]
+
+async def keyphrase_stage(scoring: SummaryScoring) -> None:
+    summary = scoring.summary
+    included, suggested = await spacy_pool.run(
+        suggest_keyphrases, summary.summary, summary.chunks, summary.keyphrase_matcher
     )
+    scoring.results["included_keyphrases"] = included
+    scoring.results["suggested_keyphrases"] = suggested
+
 
-    if junk_filter:
-        return summary, SummaryScoreResults(**results)
+async def content_stage(scoring: SummaryScoring) -> None:
+    # The model is loaded off the event loop on first use. The source's token
+    # ids are cached, so only the summary is tokenized, and concurrent requests
+    # are batched before they reach the summary scoring pool.
+    content_pipe = await LongformerPipeline.ashared(content_model)
+    scoring.results["content"] = await content_pipe.ascore(
+        scoring.summary.summary.text, scoring.summary.source.text
+    )
 
-    volume = await strapi.get_text_meta(summary_input.page_slug)
 
-    # Summary meets minimum requirements. Score it.
-    input_text = summary.summary.text + "</s>" + summary.source.text
-    results["content"] = float(content_pipe(input_text)[0]["score"])
+async def volume_prior_stage(scoring: SummaryScoring) -> None:
+    scoring.prior = await fetch_volume_prior(
+        scoring.summary_input.page_slug, scoring.strapi, scoring.supabase
+    )
+
+
+# Cheap checks run first. Once a summary fails the junk filter, or its scores
+# are cached, the stages that remain cannot change the outcome and are skipped.
+# Every score in SummaryScoreResults is computed before the junk filter is
+# checked, so only the volume prior and content are skipped. Stages of equal
+# cost run concurrently: the language, profanity and keyphrase checks run one
+# at a time in the spaCy pool, overlapping the similarity RPC and containment
+# on the event loop, and the volume prior fetch overlaps content scoring.
+summary_stages = StagePipeline(
+    [
+        Stage("prepare", 0, prepare_stage),
+        Stage("cached_result", 1, cache_stage),
+        Stage("english", 2, english_stage),
+        Stage("profanity", 2, profanity_stage),
+        Stage("containment", 2, containment_stage),
+        Stage("similarity", 2, similarity_stage),
+        Stage("keyphrases", 2, keyphrase_stage),
+        Stage("volume_prior", 3, volume_prior_stage),
+        Stage("content", 3, content_stage),
+    ],
+    is_decided=lambda scoring: (
+        scoring.cached is not None or fails_junk_filter(scoring.results)
+    ),
+)
+
+
+async def apply_volume_prior(
+    scoring: SummaryScoring, background_tasks: Optional[BackgroundTasks]
+) -> None:
+    """Sets the content threshold from the volume prior, and updates the
+    prior with the content score if the student is enrolled in a class."""
+    summary_input, results = scoring.summary_input, scoring.results
 
     # Calculate threshold for content feedback
-    # Fetch prior from Supabase
-    prior_data = await supabase.get_volume_prior(volume.slug)
+    prior_data = scoring.prior
     volume_prior = ConjugateNormal(prior_data)
     results["content_threshold"] = volume_prior.threshold
 
@@ -173,13 +287,68 @@ async def summary_score(
     if summary_input.enrolled_in_class is True:
         volume_prior.update([results["content"]])
         updated_prior = VolumePrior(
-            slug=volume.slug,
+            slug=prior_data.slug,
             mean=volume_prior.mu,
             support=volume_prior.k,
             alpha=volume_prior.alpha,
             beta=volume_prior.beta,
         )
 
-        await supabase.update_volume_prior(updated_prior)
+        if background_tasks is not None:
+            background_tasks.add_task(
+                scoring.supabase.update_volume_prior, updated_prior
+            )
+        else:
+            await scoring.timings.run(
+                "update_prior", scoring.supabase.update_volume_prior(updated_prior)
+            )
 
-    return summary, SummaryScoreResults(**results)
+
+async def summary_score(
+    summary_input: SummaryInputStrapi,
+    strapi: Strapi,
+    supabase: SupabaseClient,
+    faiss: FAISS_Wrapper,
+    background_tasks: Optional[BackgroundTasks] = None,
+) -> tuple[Summary, SummaryScoreResults]:
+    """Checks summary for text copied from the source and for semantic
+    relevance to the source text. If it passes these checks, score the summary
+    using a Huggingface pipeline.
+
+    The checks run as summary_stages, cheapest first. If a summary fails the
+    junk filter, it is not scored for content, and content is None. If the score
+    cache is enabled, a repeated request returns the cached scores and does
+    not update the volume prior again. If background_tasks is given, the
+    volume prior is updated after the response is sent. Stage timings are
+    logged and kept on the returned Summary.
+    """
+    timings = StageTimings()
+    scoring = SummaryScoring(summary_input, strapi, supabase, faiss, timings)
+    score = None
+    try:
+        skipped = await summary_stages.run(scoring, timings)
+        summary = scoring.summary
+
+        if scoring.cached is not None:
+            summary.embedding = scoring.cached.embedding
+            results = scoring.cached.results
+        else:
+            if "content" in scoring.results:
+                await apply_volume_prior(scoring, background_tasks)
+            results = SummaryScoreResults(**scoring.results)
+            score = CachedScore(results, summary.embedding)
+    finally:
+        if scoring.cache_key is not None and scoring.cached is None:
+            summary_score_cache.put(scoring.cache_key, score)
+
+    extra = {
+        "page_slug": summary_input.page_slug,
+        "stages": timings.report(),
+        "skipped_stages": skipped,
+    }
+    if summary_score_cache.enabled:
+        extra["score_cache_hit"] = scoring.cached is not None
+        extra["score_cache_hit_rate"] = summary_score_cache.hit_rate
+    logger.info("Summary scoring stages", extra=extra)
+
+    return summary, results.model_copy(deep=True)
@@ -14,6 +14,16 @@ with open("assets/summary_feedback.toml", "rb") as f:
         feedback_processors[score_type] = FeedbackProcessor(**values)
 
 
+def fails_junk_filter(results: dict) -> bool:
+    """Whether any score computed so far fails a junk filter. Missing and
+    None scores do not fail."""
+    return any(
+        processor(results.get(score_type)).is_passed is False
+        for score_type, processor in feedback_processors.items()
+        if processor.junk_filter
+    )
+
+
 def summary_feedback(results: SummaryScoreResults) -> SummaryResultsWithFeedback:
     """Provide feedback on a summary based on the results
     of the summary scoring model."""
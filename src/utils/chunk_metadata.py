@@ -0,0 +1,320 @@
+"""
+Columnar storage for the metadata of indexed chunks.
+Used by FAISS_Wrapper in place of one Python dict per chunk.
+"""
+
+import json
+import threading
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+
+class ChunkRows:
+    """Append-only rows of chunk metadata, shared by every copy of a store.
+
+    - Text, module, chapter and page slugs are interned: each column is an
+      int32 array of codes into a per-column vocabulary. -1 encodes None.
+    - Chunk content lives in one contiguous UTF-8 buffer, addressed by
+      per-row offsets and lengths.
+
+    A row is never modified once written, so readers of older versions can
+    use it while a writer appends. Appends are serialized by a lock.
+    """
+
+    interned_columns = ["text", "module", "chapter", "page"]
+
+    def __init__(self) -> None:
+        self.slugs: list[Optional[str]] = []
+        self.vocab: dict[str, dict[str, int]] = {c: {} for c in self.interned_columns}
+        self.values: dict[str, list[str]] = {c: [] for c in self.interned_columns}
+        self.codes: dict[str, np.ndarray] = {
+            c: np.empty(0, dtype=np.int32) for c in self.interned_columns
+        }
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.lengths = np.empty(0, dtype=np.int64)
+        self.content = bytearray()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.slugs)
+
+    def _reserve(self, size: int) -> None:
+        """Grow the per-row arrays geometrically to hold at least size rows.
+        Arrays are replaced rather than resized in place, so readers holding
+        the previous arrays still see every row they know of."""
+        capacity = len(self.offsets)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 64)
+        for column in self.interned_columns:
+            self.codes[column] = np.resize(self.codes[column], capacity)
+        self.offsets = np.resize(self.offsets, capacity)
+        self.lengths = np.resize(self.lengths, capacity)
+
+    def _intern(self, column: str, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        vocab = self.vocab[column]
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(self.values[column])
+            self.values[column].append(value)
+        return code
+
+    def append(self, data: dict) -> int:
+        """Writes a row. Returns its ID."""
+        encoded = data["content"].encode("utf-8")
+        with self.lock:
+            row = len(self.slugs)
+            self._reserve(row + 1)
+            for column in self.interned_columns:
+                self.codes[column][row] = self._intern(column, data[column])
+            self.offsets[row] = len(self.content)
+            self.lengths[row] = len(encoded)
+            self.content.extend(encoded)
+            self.slugs.append(data["chunk"])
+        return row
+
+    def value(self, column: str, row: int) -> Optional[str]:
+        code = self.codes[column][row]
+        return self.values[column][code] if code >= 0 else None
+
+    def content_of(self, row: int) -> str:
+        start = int(self.offsets[row])
+        end = start + int(self.lengths[row])
+        return self.content[start:end].decode("utf-8")
+
+
+class ChunkMetadata:
+    """Chunk metadata addressed by chunk ID (the FAISS ID).
+
+    One version of the store. Rows live in ChunkRows, which is shared by
+    copies, so copying a store costs only the changes it has not merged:
+
+    - Chunk slugs map to IDs through a base dict, shared and never modified,
+      and a per-version dict of the slugs added or removed since.
+    - Chunks are indexed by page on merge: live IDs sorted by page code,
+      with the offset of each page's range. IDs added since are kept per
+      page, and stale entries are filtered out on lookup, so finding the
+      chunks of a page does not scan the whole store.
+
+    Changes are merged once they exceed max_changes. Replaced or removed
+    content is left in the buffer until it makes up half of it, then the
+    live rows are copied to new ChunkRows.
+
+    IDs are allocated sequentially. A replaced chunk gets a new ID, so
+    rows are only ever appended.
+    """
+
+    max_changes = 1024  # Changes are merged once there are more than this
+    min_compact_bytes = 1_000_000
+
+    def __init__(self) -> None:
+        self.rows = ChunkRows()
+        self._base: dict[str, int] = {}  # Slug -> ID at the last merge
+        self._changes: dict[str, Optional[int]] = {}  # Slug -> ID, None if removed
+        self._n_changes = 0  # Adds and removals since the last merge
+        self._size = 0
+        self._garbage = 0  # Bytes of content of chunks replaced or removed
+        self._page_order = np.empty(0, dtype=np.int64)  # IDs sorted by page code
+        self._page_starts = np.zeros(1, dtype=np.int64)  # Page code -> offset
+        self._page_added: dict[int, set[int]] = {}  # Page code -> IDs since
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_slug: str) -> bool:
+        return self.id_of(chunk_slug) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterates over the slugs of all chunks."""
+        for chunk_slug in self._base:
+            if chunk_slug not in self._changes:
+                yield chunk_slug
+        for chunk_slug, chunk_id in self._changes.items():
+            if chunk_id is not None:
+                yield chunk_slug
+
+    @property
+    def next_id(self) -> int:
+        return len(self.rows)
+
+    def id_of(self, chunk_slug: str) -> Optional[int]:
+        if chunk_slug in self._changes:
+            return self._changes[chunk_slug]
+        return self._base.get(chunk_slug)
+
+    def copy(self) -> "ChunkMetadata":
+        """Returns a copy that can be modified without affecting readers of
+        this store. Only the unmerged changes are copied."""
+        store = ChunkMetadata()
+        store.rows = self.rows
+        store._base = self._base
+        store._changes = dict(self._changes)
+        store._n_changes = self._n_changes
+        store._size = self._size
+        store._garbage = self._garbage
+        store._page_order = self._page_order
+        store._page_starts = self._page_starts
+        store._page_added = {code: set(ids) for code, ids in self._page_added.items()}
+        return store
+
+    def _set(self, chunk_slug: str, chunk_id: Optional[int]) -> None:
+        previous_id = self.id_of(chunk_slug)
+        if previous_id is not None:
+            self._garbage += int(self.rows.lengths[previous_id])
+        self._size += (chunk_id is not None) - (previous_id is not None)
+        self._changes[chunk_slug] = chunk_id
+        self._n_changes += 1
+        if self._n_changes > self.max_changes:
+            self._merge()
+        if self._garbage > max(self.min_compact_bytes, len(self.rows.content) // 2):
+            self.compact()
+
+    def add(self, data: dict) -> int:
+        """Adds or replaces a chunk. Returns its new ID."""
+        chunk_id = self.rows.append(data)
+        page_code = int(self.rows.codes["page"][chunk_id])
+        if page_code >= 0:
+            self._page_added.setdefault(page_code, set()).add(chunk_id)
+        self._set(data["chunk"], chunk_id)
+        return chunk_id
+
+    def remove(self, chunk_slug: str) -> Optional[int]:
+        """Removes a chunk. Returns its ID, or None if it was not stored."""
+        chunk_id = self.id_of(chunk_slug)
+        if chunk_id is not None:
+            self._set(chunk_slug, None)
+        return chunk_id
+
+    def _merge(self) -> None:
+        """Fold the changes into a new base and reindex the chunks by page.
+        The stable sort keeps the IDs of each page in ascending order."""
+        base = dict(self._base)
+        for chunk_slug, chunk_id in self._changes.items():
+            if chunk_id is None:
+                base.pop(chunk_slug, None)
+            else:
+                base[chunk_slug] = chunk_id
+        self._base = base
+        self._changes = {}
+        self._n_changes = 0
+
+        ids = np.sort(np.fromiter(base.values(), dtype=np.int64, count=len(base)))
+        codes = self.rows.codes["page"][ids]
+        ids, codes = ids[codes >= 0], codes[codes >= 0]
+        self._page_order = ids[np.argsort(codes, kind="stable")]
+        counts = np.bincount(codes, minlength=len(self.rows.values["page"]))
+        self._page_starts = np.concatenate([[0], np.cumsum(counts)])
+        self._page_added = {}
+
+    def _live_ids(self) -> np.ndarray:
+        return np.sort(np.fromiter(map(self.id_of, self), dtype=np.int64))
+
+    def compact(self) -> None:
+        """Copies the live rows to new ChunkRows without replaced or removed
+        content, keeping their IDs, and merges the changes."""
+        live = self._live_ids()
+        n = self.next_id
+        rows = ChunkRows()
+        rows.slugs = [None] * n
+        rows.vocab = {column: dict(vocab) for column, vocab in self.rows.vocab.items()}
+        rows.values = {
+            column: list(values) for column, values in self.rows.values.items()
+        }
+        rows.codes = {
+            column: codes[:n].copy() for column, codes in self.rows.codes.items()
+        }
+        rows.offsets = np.zeros(n, dtype=np.int64)
+        rows.lengths = np.zeros(n, dtype=np.int64)
+        for chunk_id in live.tolist():
+            start = int(self.rows.offsets[chunk_id])
+            end = start + int(self.rows.lengths[chunk_id])
+            rows.slugs[chunk_id] = self.rows.slugs[chunk_id]
+            rows.offsets[chunk_id] = len(rows.content)
+            rows.lengths[chunk_id] = end - start
+            rows.content.extend(memoryview(self.rows.content)[start:end])
+        self.rows = rows
+        self._garbage = 0
+        self._merge()
+
+    def slug(self, chunk_id: int) -> str:
+        return self.rows.slugs[chunk_id]
+
+    def page(self, chunk_id: int) -> str:
+        return self.rows.value("page", chunk_id)
+
+    def content_of(self, chunk_id: int) -> str:
+        return self.rows.content_of(chunk_id)
+
+    def get(self, chunk_id: int) -> dict:
+        """Returns the metadata of a chunk as a dict."""
+        data = {
+            column: self.rows.value(column, chunk_id)
+            for column in self.rows.interned_columns
+        }
+        data["chunk"] = self.rows.slugs[chunk_id]
+        data["content"] = self.rows.content_of(chunk_id)
+        return data
+
+    def ids_on_page(self, page_slug: str) -> np.ndarray:
+        """IDs of all chunks on a page, in ascending order."""
+        code = self.rows.vocab["page"].get(page_slug)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        indexed = self._page_order[:0]
+        if code + 1 < len(self._page_starts):  # Pages interned since are empty
+            start, end = self._page_starts[code], self._page_starts[code + 1]
+            indexed = self._page_order[start:end]
+        added = np.fromiter(self._page_added.get(code, ()), dtype=np.int64)
+        ids = np.union1d(indexed, added)
+        # Drop chunks removed or replaced since they were indexed
+        live = [self.id_of(self.rows.slugs[i]) == i for i in ids.tolist()]
+        return ids[np.array(live, dtype=bool)]
+
+    def save(self, path: Path) -> None:
+        """Writes the live chunks of this version to a directory, with their
+        IDs. The store itself is not modified, so this can run while it is
+        being read."""
+        store = self.copy()
+        store.compact()
+        rows = store.rows
+        path.mkdir(parents=True, exist_ok=True)
+        for column in rows.interned_columns:
+            np.save(path / f"{column}.npy", rows.codes[column])
+        np.save(path / "offsets.npy", rows.offsets)
+        np.save(path / "lengths.npy", rows.lengths)
+        (path / "content.bin").write_bytes(rows.content)
+        vocabulary = {"slugs": rows.slugs, "values": rows.values}
+        (path / "vocabulary.json").write_text(json.dumps(vocabulary))
+
+    @classmethod
+    def load(cls, path: Path) -> "ChunkMetadata":
+        """Reads a store written by save."""
+        rows = ChunkRows()
+        vocabulary = json.loads((path / "vocabulary.json").read_text())
+        rows.slugs = vocabulary["slugs"]
+        rows.values = vocabulary["values"]
+        rows.vocab = {
+            column: {value: code for code, value in enumerate(values)}
+            for column, values in rows.values.items()
+        }
+        rows.codes = {
+            column: np.load(path / f"{column}.npy") for column in rows.interned_columns
+        }
+        rows.offsets = np.load(path / "offsets.npy")
+        rows.lengths = np.load(path / "lengths.npy")
+        rows.content = bytearray((path / "content.bin").read_bytes())
+
+        store = cls()
+        store.rows = rows
+        store._changes = {
+            slug: chunk_id
+            for chunk_id, slug in enumerate(rows.slugs)
+            if slug is not None
+        }
+        store._size = len(store._changes)
+        store._merge()
+        return store
@@ -0,0 +1,107 @@
+"""
+A process-wide LRU cache of text embeddings.
+Shared by every EmbeddingPipeline so that the same text is only embedded
+once, whether it is a summary being scored or a retrieval query.
+"""
+
+import hashlib
+import os
+import threading
+from typing import Awaitable, Callable
+
+import numpy as np
+from cachetools import LRUCache
+
+from ..schemas.cache import CacheStats
+
+
+class EmbeddingCache:
+    """Bounded LRU cache of embeddings keyed by a hash of the model name
+    and the whitespace-normalized text.
+    Thread-safe, since embeddings may be computed off the event loop."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.cache = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model_name}\0{normalized}".encode()).hexdigest()
+
+    def _lookup(
+        self, model_name: str, texts: list[str]
+    ) -> tuple[list[str], dict[str, np.ndarray], dict[str, str]]:
+        """Returns the keys of texts, the cached embeddings found, and the
+        missing texts by key, deduplicated and in order."""
+        keys = [self.key(model_name, text) for text in texts]
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key not in found and key in self.cache:
+                    found[key] = self.cache[key]
+
+            hits = sum(key in found for key in keys)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        return keys, found, missing
+
+    def _store(
+        self,
+        keys: list[str],
+        found: dict[str, np.ndarray],
+        missing: dict[str, str],
+        embeddings,
+    ) -> np.ndarray:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self.lock:
+            for key, embedding in zip(missing, embeddings):
+                found[key] = embedding.copy()
+                self.cache[key] = found[key]
+
+        # Stack into a new array so callers can modify it freely
+        return np.stack([found[key] for key in keys])
+
+    def get_or_embed(
+        self,
+        model_name: str,
+        texts: list[str],
+        embed: Callable[[list[str]], np.ndarray],
+    ) -> np.ndarray:
+        """Returns a (n, dim) array of embeddings for texts.
+        Only the texts missing from the cache are passed to embed, once each."""
+        keys, found, missing = self._lookup(model_name, texts)
+        embeddings = embed(list(missing.values())) if missing else []
+        return self._store(keys, found, missing, embeddings)
+
+    async def aget_or_embed(
+        self,
+        model_name: str,
+        texts: list[str],
+        embed: Callable[[list[str]], Awaitable[np.ndarray]],
+    ) -> np.ndarray:
+        """get_or_embed for a coroutine embed function."""
+        keys, found, missing = self._lookup(model_name, texts)
+        embeddings = await embed(list(missing.values())) if missing else []
+        return self._store(keys, found, missing, embeddings)
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                size=len(self.cache),
+                maxsize=int(self.cache.maxsize),
+            )
+
+
+embedding_cache = EmbeddingCache(
+    maxsize=int(os.getenv("EMBEDDING_CACHE_SIZE", 4096)),
+)
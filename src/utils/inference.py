@@ -0,0 +1,65 @@
+"""
+Runs model inference in dedicated thread pools, off the event loop.
+Torch and spaCy release the GIL for most of their work, so the event loop
+keeps serving other requests (including streaming chat tokens) while a
+model runs.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from fastapi import HTTPException
+
+R = TypeVar("R")
+
+
+def overloaded(name: str) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=f"The {name} model is overloaded. Please try again.",
+    )
+
+
+class InferencePool:
+    """A thread pool for one class of models with a bounded queue.
+
+    Calls beyond max_workers wait in the queue. Once max_queue calls are
+    waiting, further calls are rejected with a 503, so that a slow model
+    sheds load instead of accumulating requests that will time out anyway.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"inference-{name}"
+        )
+        self.pending = 0  # Only modified on the event loop thread
+
+    async def run(self, fn: Callable[..., R], *args, **kwargs) -> R:
+        """Runs fn(*args, **kwargs) in the pool and returns its result."""
+        if self.pending >= self.max_workers + self.max_queue:
+            raise overloaded(self.name)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(fn, *args, **kwargs)
+            )
+        finally:
+            self.pending -= 1
+
+
+max_queue = int(os.getenv("INFERENCE_QUEUE_SIZE", 64))
+
+# One worker per pool: GPU models serialize on the device anyway, the
+# embedding model batches concurrent requests itself, and spaCy's shared
+# vocabulary is not safe to modify from several threads.
+embedding_pool = InferencePool("embedding", max_workers=1, max_queue=max_queue)
+summary_pool = InferencePool("summary scoring", max_workers=1, max_queue=max_queue)
+answer_pool = InferencePool("answer scoring", max_workers=1, max_queue=max_queue)
+spacy_pool = InferencePool("spaCy", max_workers=1, max_queue=max_queue)
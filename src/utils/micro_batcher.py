@@ -0,0 +1,109 @@
+"""
+Combines concurrent inference requests into batched model calls.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, Optional, Sequence, TypeVar
+
+from .inference import overloaded
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Collects items submitted by concurrent callers and passes them to
+    the coroutine function fn together.
+
+    A batch is started by the first waiting item and closed when it holds
+    max_batch_size items or max_wait seconds have passed, whichever comes
+    first. fn receives the items of a batch in submission order and must
+    return one result per item. Each caller receives the results of its
+    own items. If fn raises, every caller in the batch receives the error.
+
+    If max_queue is set, at most max_queue items wait for a batch. Further
+    submissions are rejected with a 503 named after name, so that overload
+    is shed before it reaches the inference pool.
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[list[T]], Awaitable[Sequence[R]]],
+        max_batch_size: int,
+        max_wait: float,
+        max_queue: Optional[int] = None,
+        name: str = "model",
+    ) -> None:
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self._queue: asyncio.Queue[tuple[T, asyncio.Future]] | None = None
+        self._worker: asyncio.Task | None = None
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    async def submit(self, items: list[T]) -> list[R]:
+        """Returns the results for items, computed in one or more batches."""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        # An empty queue takes any submission, so large ones are not refused
+        queued = self._queue.qsize()
+        if self.max_queue is not None and queued + len(items) > self.max_queue:
+            if queued:
+                raise overloaded(self.name)
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        for item, future in zip(items, futures):
+            self._queue.put_nowait((item, future))
+        return list(await asyncio.gather(*futures))
+
+    async def close(self) -> None:
+        """Stops the worker. Items still queued are not processed."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _collect(self) -> list[tuple[T, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = await self.fn([item for item, _ in batch])
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
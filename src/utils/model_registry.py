@@ -0,0 +1,117 @@
+"""
+A process-wide registry of loaded models.
+Every pipeline is obtained through it, so each model is loaded once per
+process no matter how many services use it.
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, TypeVar
+
+import torch
+
+from ..schemas.models import ModelStats
+
+T = TypeVar("T")
+
+
+def _modules(model: Any) -> list[torch.nn.Module]:
+    """Torch modules held by a pipeline, directly or through a wrapped
+    Hugging Face pipeline."""
+    if isinstance(model, torch.nn.Module):
+        return [model]
+    modules = []
+    for value in getattr(model, "__dict__", {}).values():
+        if isinstance(value, torch.nn.Module):
+            modules.append(value)
+        elif isinstance(getattr(value, "model", None), torch.nn.Module):
+            modules.append(value.model)
+    return modules
+
+
+def _resident_bytes(model: Any) -> int:
+    """Bytes held by the parameters and buffers of a pipeline's modules.
+    Models run outside torch report their size through weight_bytes."""
+    external = sum(
+        getattr(value, "weight_bytes", 0)
+        for value in getattr(model, "__dict__", {}).values()
+    )
+    tensors = [
+        tensor
+        for module in _modules(model)
+        for tensor in [*module.parameters(), *module.buffers()]
+    ]
+    unique = {tensor.data_ptr(): tensor for tensor in tensors}
+    return external + sum(
+        tensor.numel() * tensor.element_size() for tensor in unique.values()
+    )
+
+
+class ModelRegistry:
+    """Lazily loaded models keyed by name.
+
+    get() loads a model with its loader on first use and returns the same
+    instance afterwards. Loading is serialized per name, so concurrent first
+    calls still load the model once, while other models stay available.
+    On the event loop, use aget(), which loads models in a worker thread.
+    Tests can swap in stand-ins with override().
+    """
+
+    def __init__(self) -> None:
+        self.models: dict[str, Any] = {}
+        self.stats: dict[str, ModelStats] = {}
+        self.lock = threading.Lock()  # Guards models and load_locks
+        self.load_locks: dict[str, threading.Lock] = {}
+
+    def get(self, name: str, loader: Callable[[], T]) -> T:
+        model = self.models.get(name)
+        if model is not None:
+            return model
+
+        with self.lock:
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            model = self.models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                model = loader()
+                load_time = time.perf_counter() - start
+                with self.lock:
+                    self.models[name] = model
+                    self.stats[name] = ModelStats(
+                        name=name,
+                        resident_bytes=_resident_bytes(model),
+                        load_time_ms=load_time * 1000,
+                    )
+        return model
+
+    async def aget(self, name: str, loader: Callable[[], T]) -> T:
+        """get() without blocking the event loop while the model loads."""
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        return await asyncio.to_thread(self.get, name, loader)
+
+    @contextmanager
+    def override(self, name: str, model: Any) -> Iterator[None]:
+        """Serves model under name until the context exits."""
+        with self.lock:
+            previous = self.models.get(name)
+            self.models[name] = model
+        try:
+            yield
+        finally:
+            with self.lock:
+                if previous is None:
+                    self.models.pop(name, None)
+                else:
+                    self.models[name] = previous
+
+    def report(self) -> list[ModelStats]:
+        """Memory and load time of every model loaded so far."""
+        return list(self.stats.values())
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,86 @@
+"""
+Runs the stages of a request in order of cost, and stops once the outcome
+is decided, so that expensive stages are skipped when cheap ones suffice.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from itertools import groupby
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from ..schemas.summary import StageStats
+from .stage_timings import StageTimings
+
+C = TypeVar("C")
+
+
+def cancel_pending(tasks: list[asyncio.Task]) -> None:
+    """Cancels tasks whose results are no longer needed."""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()  # Failures are not needed either
+
+
+@dataclass(frozen=True)
+class Stage(Generic[C]):
+    name: str
+    cost: int  # Cheapest first. Stages of equal cost run concurrently
+    run: Callable[[C], Awaitable[None]]
+
+
+class StagePipeline(Generic[C]):
+    """Runs stages on a shared context. After each group of stages of equal
+    cost, is_decided is checked on the context, and if it returns True the
+    remaining stages are skipped."""
+
+    def __init__(self, stages: list[Stage[C]], is_decided: Callable[[C], bool]):
+        self.stages = sorted(stages, key=lambda stage: stage.cost)
+        self.is_decided = is_decided
+        self.runs = {stage.name: 0 for stage in self.stages}
+        self.skips = {stage.name: 0 for stage in self.stages}
+        self.total_ms = {stage.name: 0.0 for stage in self.stages}
+
+    async def run(self, context: C, timings: StageTimings) -> list[str]:
+        """Runs the stages and returns the names of the skipped stages."""
+        skipped = []
+        for _, group in groupby(self.stages, key=lambda stage: stage.cost):
+            group = list(group)
+            if skipped or self.is_decided(context):
+                skipped += [stage.name for stage in group]
+                continue
+
+            tasks = [
+                asyncio.create_task(timings.run(stage.name, stage.run(context)))
+                for stage in group
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                cancel_pending(tasks)
+
+            for stage in group:
+                start, end = timings.stages[stage.name]
+                self.runs[stage.name] += 1
+                self.total_ms[stage.name] += end - start
+
+        for name in skipped:
+            self.skips[name] += 1
+        return skipped
+
+    def stats(self) -> list[StageStats]:
+        return [
+            StageStats(
+                name=stage.name,
+                cost=stage.cost,
+                runs=self.runs[stage.name],
+                skips=self.skips[stage.name],
+                mean_ms=(
+                    self.total_ms[stage.name] / self.runs[stage.name]
+                    if self.runs[stage.name]
+                    else 0.0
+                ),
+            )
+            for stage in self.stages
+        ]
@@ -0,0 +1,50 @@
+"""
+Records when the stages of a request start and finish, so that the
+critical path of a request with concurrent stages can be seen in the logs.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimings:
+    """Start and end of each named stage in milliseconds since creation."""
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.stages: dict[str, tuple[float, float]] = {}
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self.origin) * 1000
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Awaits awaitable and records it as the stage name."""
+        with self.measure(name):
+            return await awaitable
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start = self._now_ms()
+        try:
+            yield
+        finally:
+            self.stages[name] = (start, self._now_ms())
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """Stages in order of their start, for structured logs."""
+        return {
+            name: {"start_ms": round(start, 2), "duration_ms": round(end - start, 2)}
+            for name, (start, end) in sorted(
+                self.stages.items(), key=lambda stage: stage[1][0]
+            )
+        }
+
+    def server_timing(self) -> str:
+        """Stage durations as a Server-Timing header value."""
+        return ", ".join(
+            f"{name};dur={timing['duration_ms']}"
+            for name, timing in self.report().items()
+        )
@@ -0,0 +1,7 @@
+-- SHA-256 of each chunk's content, used by the embedding endpoints to skip
+-- chunks that did not change since they were embedded.
+alter table embeddings add column if not exists content_hash text;
+
+update embeddings
+set content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex')
+where content_hash is null;
@@ -0,0 +1,19 @@
+-- Last time each chunk was written. FAISS snapshots use it as a watermark
+-- to fetch only the rows that changed since they were saved, so it must be
+-- set on every update, not only on insert.
+alter table embeddings
+add column if not exists updated_at timestamptz not null default now();
+
+create or replace function set_updated_at() returns trigger
+language plpgsql as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$;
+
+drop trigger if exists embeddings_set_updated_at on embeddings;
+
+create trigger embeddings_set_updated_at
+before update on embeddings
+for each row execute function set_updated_at();
@@ -0,0 +1,39 @@
+-- Upserts the embeddings of a page and deletes the page's chunks that are
+-- not in keep, in one transaction, so that a failed write cannot leave a
+-- page half updated. Used by /generate/embeddings/page. Returns the slugs
+-- of the deleted chunks.
+create or replace function write_page_embeddings(
+  target_page text,
+  page_rows jsonb,
+  keep text[]
+) returns table (deleted_chunk text)
+language plpgsql as $$
+begin
+  insert into embeddings as e (
+    text, module, chapter, page, chunk, content, content_hash, embedding
+  )
+  select
+    r ->> 'text',
+    r ->> 'module',
+    r ->> 'chapter',
+    r ->> 'page',
+    r ->> 'chunk',
+    r ->> 'content',
+    r ->> 'content_hash',
+    (r ->> 'embedding')::vector
+  from jsonb_array_elements(page_rows) as r
+  on conflict (chunk) do update set
+    text = excluded.text,
+    module = excluded.module,
+    chapter = excluded.chapter,
+    page = excluded.page,
+    content = excluded.content,
+    content_hash = excluded.content_hash,
+    embedding = excluded.embedding;
+
+  return query
+  delete from embeddings as e
+  where e.page = target_page and e.chunk <> all(keep)
+  returning e.chunk;
+end;
+$$;
@@ -0,0 +1,114 @@
+import numpy as np
+
+from src.utils.chunk_metadata import ChunkMetadata
+
+
+def chunk(slug: str, page: str, content: str = "Some content.") -> dict:
+    return {
+        "chunk": slug,
+        "text": "test_text",
+        "module": "test_module",
+        "chapter": "test_chapter",
+        "page": page,
+        "content": content,
+    }
+
+
+async def test_interning():
+    store = ChunkMetadata()
+    first = store.add(chunk("a", "page_1"))
+    second = store.add(chunk("b", "page_1", content="Ünïcode content."))
+
+    assert store.rows.values["page"] == ["page_1"]
+    assert store.rows.codes["text"][first] == store.rows.codes["text"][second]
+    assert store.get(second) == chunk("b", "page_1", content="Ünïcode content.")
+
+    # Replacing a chunk gives it a new ID and leaves the old row as it was
+    replaced = store.add(chunk("a", "page_2"))
+    assert replaced == 2
+    assert store.id_of("a") == replaced
+    assert store.page(replaced) == "page_2"
+    assert store.page(first) == "page_1"
+    assert store.rows.values["page"] == ["page_1", "page_2"]
+    assert len(store) == 2
+
+
+async def test_ids_on_page():
+    store = ChunkMetadata()
+    for i in range(6):
+        store.add(chunk(f"chunk_{i}", f"page_{i % 2}"))
+    store.compact()
+
+    assert store.ids_on_page("page_0").tolist() == [0, 2, 4]
+    assert store.ids_on_page("missing").tolist() == []
+
+    # Changes since the last compaction are seen without reindexing
+    store.add(chunk("chunk_6", "page_0"))
+    store.add(chunk("chunk_0", "page_1"))  # Moved, as ID 7
+    store.add(chunk("chunk_7", "page_2"))
+    store.remove("chunk_2")
+    assert store.ids_on_page("page_0").tolist() == [4, 6]
+    assert store.ids_on_page("page_1").tolist() == [1, 3, 5, 7]
+    assert store.ids_on_page("page_2").tolist() == [8]
+
+    store.compact()
+    assert store.ids_on_page("page_0").tolist() == [4, 6]
+    assert store.ids_on_page("page_1").tolist() == [1, 3, 5, 7]
+
+
+async def test_copy():
+    store = ChunkMetadata()
+    for i in range(4):
+        store.add(chunk(f"chunk_{i}", "page_0"))
+    store.compact()
+
+    copy = store.copy()
+    copy.add(chunk("chunk_0", "page_0", content="New content."))
+    copy.remove("chunk_1")
+    copy.add(chunk("chunk_4", "page_1"))
+
+    # The rows are shared, but the original does not see the changes
+    assert copy.rows is store.rows
+    assert sorted(store) == ["chunk_0", "chunk_1", "chunk_2", "chunk_3"]
+    assert store.ids_on_page("page_0").tolist() == [0, 1, 2, 3]
+    assert store.content_of(store.id_of("chunk_0")) == "Some content."
+    assert sorted(copy) == ["chunk_0", "chunk_2", "chunk_3", "chunk_4"]
+    assert copy.ids_on_page("page_0").tolist() == [2, 3, 4]
+    assert copy.content_of(copy.id_of("chunk_0")) == "New content."
+
+
+async def test_compact():
+    store = ChunkMetadata()
+    store.add(chunk("a", "page_1", content="First version."))
+    store.add(chunk("b", "page_1", content="Second chunk."))
+    store.add(chunk("a", "page_1", content="Replaced."))
+    store.add(chunk("c", "page_1", content="Removed."))
+    store.remove("c")
+
+    rows = store.rows
+    store.compact()
+    assert bytes(store.rows.content) == b"Second chunk.Replaced."
+    assert bytes(rows.content).startswith(b"First version.")  # Left for readers
+    assert store.content_of(store.id_of("a")) == "Replaced."
+    assert store.content_of(store.id_of("b")) == "Second chunk."
+
+
+async def test_save_load(tmp_path):
+    store = ChunkMetadata()
+    for i in range(5):
+        store.add(chunk(f"chunk_{i}", f"page_{i % 2}", content=f"Content {i}."))
+    store.remove("chunk_1")
+    store.save(tmp_path)
+
+    loaded = ChunkMetadata.load(tmp_path)
+    assert set(loaded) == set(store)
+    assert loaded.rows.values == store.rows.values
+    for chunk_id in [0, 2, 3, 4]:
+        assert loaded.id_of(f"chunk_{chunk_id}") == chunk_id
+        assert loaded.get(chunk_id) == store.get(chunk_id)
+    assert np.array_equal(loaded.ids_on_page("page_1"), [3])
+
+    # The loaded store keeps IDs and interned values as it grows
+    assert loaded.add(chunk("chunk_5", "page_1")) == 5
+    assert loaded.rows.values["page"] == ["page_0", "page_1"]
+    assert loaded.ids_on_page("page_1").tolist() == [3, 5]
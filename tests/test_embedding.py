@@ -1,3 +1,12 @@
+import faiss as faiss_lib
+import numpy as np
+import pytest
+
+from src.dependencies.faiss import FAISS_Wrapper, SearchIndex
+from src.pipelines.embed import EmbeddingPipeline
+from src.schemas.embedding import IndexBackend, PageEmbeddingInput
+
+
 async def test_generate_embeddings(client):
     response = await client.post(
         "/generate/embedding",
@@ -39,6 +48,80 @@ async def test_generate_embeddings(client):
     assert response.status_code == 201
 
 
+async def test_generate_page_embeddings(client, app, supabase):
+    page = {
+        "text_slug": "test_text",
+        "page_slug": "bulk_test_page",
+        "chunks": [
+            {"chunk_slug": f"bulk_test_chunk_{n}", "content": f"Bulk chunk {n}."}
+            for n in range(3)
+        ],
+    }
+    response = await client.post("/generate/embeddings/page", json=page)
+    assert response.status_code == 201, response.text
+    assert len(response.json()["upserted"]) == 3
+
+    # Republish the page with one chunk changed and without its last chunk
+    page["chunks"] = page["chunks"][:2]
+    page["chunks"][1]["content"] = "Bulk chunk 1, revised."
+    page["chunk_slugs"] = ["bulk_test_chunk_0", "bulk_test_chunk_1"]
+    response = await client.post("/generate/embeddings/page", json=page)
+    assert response.status_code == 201, response.text
+    results = response.json()
+    assert results["upserted"] == ["bulk_test_chunk_1"]
+    assert results["skipped"] == ["bulk_test_chunk_0"]
+    assert results["deleted"] == ["bulk_test_chunk_2"]
+
+    # Nothing changed, so nothing is embedded or indexed
+    response = await client.post("/generate/embeddings/page", json=page)
+    assert response.status_code == 201, response.text
+    results = response.json()
+    assert len(results["skipped"]) == 2
+    assert results["upserted"] == results["deleted"] == []
+    assert results["job"] is None
+
+    response = await (
+        supabase.table("embeddings")
+        .select("chunk")
+        .eq("page", "bulk_test_page")
+        .execute()
+    )
+    assert {row["chunk"] for row in response.data} == {
+        "bulk_test_chunk_0",
+        "bulk_test_chunk_1",
+    }
+
+    await app.state.faiss.join()
+    response = await client.post(
+        "/retrieve/chunks",
+        json={"page_slugs": ["bulk_test_page"], "text": "Bulk chunk", "match_count": 5},
+    )
+    chunks = {match["chunk"] for match in response.json()["matches"]}
+    assert chunks == {"bulk_test_chunk_0", "bulk_test_chunk_1"}
+
+    await client.post(
+        "/delete/embedding", json={"page_slug": "bulk_test_page", "chunk_slugs": []}
+    )
+
+
+async def test_skip_unchanged_without_content_hash(supabase):
+    """Without the content_hash column, unchanged chunks are found by
+    comparing their content."""
+    supabase.has_content_hash = False
+    page = PageEmbeddingInput(
+        text_slug="test_text",
+        page_slug="no_hash_test_page",
+        chunks=[{"chunk_slug": "no_hash_test_chunk", "content": "No hash chunk."}],
+    )
+    upserted, skipped, _ = await supabase.page_embeddings_generate(page)
+    assert (upserted, skipped) == (["no_hash_test_chunk"], [])
+
+    upserted, skipped, _ = await supabase.page_embeddings_generate(page)
+    assert (upserted, skipped) == ([], ["no_hash_test_chunk"])
+
+    await supabase._delete_unused("no_hash_test_page", set())
+
+
 async def test_retrieve_chunks(client):
     response = await client.post(
         "/retrieve/chunks",
@@ -118,3 +201,251 @@ async def test_delete_missing_page(client):
         },
     )
     assert response.status_code == 422
+
+
+async def test_retrieve_after_incremental_update(client, app):
+    """Chunks written through /generate/embedding are searchable
+    once their index job has been applied."""
+    await app.state.faiss.join()
+
+    response = await client.post(
+        "/retrieve/chunks",
+        json={
+            "page_slugs": ["test_page"],
+            "text": "Vestibulum erat wisi, condimentum sed, commodo vitae, ornare sit amet, wisi.",  # noqa: E501
+            "match_count": 3,
+        },
+    )
+    assert response.status_code == 200, response.text
+    matches = response.json()["matches"]
+    assert len(matches) == 3
+    assert matches[0]["chunk"] == "test_chunk_3"
+
+
+async def test_rebuild_index(client, app):
+    response = await client.post("/rebuild/index")
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+
+    await app.state.faiss.join()
+
+    response = await client.get(f"/index/jobs/{job_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "succeeded"
+
+
+async def test_index_job_not_found(client):
+    response = await client.get("/index/jobs/missing")
+    assert response.status_code == 404
+
+
+async def test_benchmark_index(client):
+    response = await client.post("/benchmark/index")
+    assert response.status_code == 200, response.text
+    reports = {report["backend"]: report for report in response.json()}
+    assert reports["cpu_flat"]["recall"] == 1.0
+
+
+async def test_retrieve_chunks_whole_page(client):
+    """Page-scoped retrieval is exact, so every chunk on the page is returned."""
+    response = await client.post(
+        "/retrieve/chunks",
+        json={
+            "page_slugs": ["test_page"],
+            "text": "An unrelated query about photosynthesis.",
+            "retrieve_strategy": "least_similar",
+            "match_count": 10,
+        },
+    )
+    assert response.status_code == 200, response.text
+    chunks = {match["chunk"] for match in response.json()["matches"]}
+    assert chunks == {"test_chunk_1", "test_chunk_2", "test_chunk_3"}
+
+
+async def test_fetch_pages(supabase):
+    """Keyset paging returns every row once, in chunk order, with the
+    total count requested only for the first page."""
+    faiss = FAISS_Wrapper(supabase, backend=IndexBackend.cpu_flat)
+    faiss.page_size = 2
+
+    pages = [page async for page in faiss._fetch_pages(columns=["chunk"])]
+    slugs = [row["chunk"] for rows, _ in pages for row in rows]
+
+    assert len(pages) > 1
+    assert slugs == sorted(set(slugs))
+    assert pages[0][1] == len(slugs)
+    assert all(total is None for _, total in pages[1:])
+
+
+async def test_snapshot_round_trip(supabase, tmp_path):
+    """A saved snapshot loads with the same chunks and watermark, and a
+    sync only applies the rows updated after its watermark."""
+    faiss = FAISS_Wrapper(
+        supabase, backend=IndexBackend.cpu_hnsw, snapshot_dir=str(tmp_path)
+    )
+    await faiss.create_faiss_index()
+    saved = faiss.snapshot
+
+    loaded = FAISS_Wrapper(
+        supabase, backend=IndexBackend.cpu_hnsw, snapshot_dir=str(tmp_path)
+    )
+    snapshot = loaded._load_snapshot()
+    assert snapshot.watermark == saved.watermark
+    assert len(snapshot.metadata) == len(saved.metadata)
+    assert set(snapshot.metadata) == set(saved.metadata)
+    assert snapshot.pages.keys() == saved.pages.keys()
+    assert snapshot.search_index.labels.tolist() == saved.search_index.labels.tolist()
+    for page_slug, partition in snapshot.pages.items():
+        assert np.array_equal(partition.vectors, saved.pages[page_slug].vectors)
+
+    await loaded._publish(snapshot)
+    assert not await loaded.sync()
+
+    # With an older watermark, the rows updated since are read again and
+    # skipped, and the watermark catches up
+    snapshot = loaded._copy(loaded.snapshot)
+    snapshot.watermark = None
+    await loaded._publish(snapshot)
+    assert await loaded.sync()
+    assert loaded.snapshot.watermark == saved.watermark
+    assert set(loaded.snapshot.metadata) == set(saved.metadata)
+    assert not loaded.snapshot.search_index.drift
+
+
+async def test_search_index_updates():
+    """A search index updated in place finds replaced chunks at their new
+    vectors, never returns removed chunks, and asks for a rebuild once it
+    has drifted too far from its build."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 16)).astype(np.float32)
+    faiss_lib.normalize_L2(vectors)
+
+    index = faiss_lib.IndexFlatIP(16)
+    index.add(vectors)
+    search_index = SearchIndex.build(index, np.arange(100))
+
+    # Chunk 0 is replaced by chunk 100, at the vector of chunk 2, and 1 removed
+    updated = search_index.updated({0, 1}, np.array([100]), vectors[2:3])
+
+    _, found = updated.search(vectors[:3], 2)
+    assert not {0, 1} & set(found.flatten())
+    assert set(found[2]) == {2, 100}
+    assert len(updated.tombstones) == 2
+    assert not updated.drifted(max_drift=0.2, max_tombstones=10)
+    assert updated.drifted(max_drift=0.02, max_tombstones=10)
+
+    # The index is shared, but the original version is unchanged for readers
+    assert updated.index is search_index.index
+    _, found = search_index.search(vectors[:3], 1)
+    assert found[:, 0].tolist() == [0, 1, 2]
+
+
+async def test_page_similarity_parity(app, supabase):
+    """The FAISS page centroid matches the Supabase page_similarity RPC."""
+    faiss = app.state.faiss
+    embedding = await supabase.embed("Aenean fermentum, elit eget tincidunt.")
+
+    expected = await supabase.page_similarity(embedding, "test_page")
+    actual = await faiss.page_similarity(embedding, "test_page")
+
+    assert actual == pytest.approx(expected, abs=1e-4)
+
+
+async def test_retrieve_chunks_batch(client):
+    queries = [
+        {
+            "page_slugs": ["test_page"],
+            "text": "Vestibulum erat wisi, condimentum sed, commodo vitae.",
+            "match_count": 1,
+        },
+        {
+            "page_slugs": ["test_page"],
+            "text": "In interdum ullamcorper dolor et vulputate. Nulla facilisi.",
+            "match_count": 1,
+        },
+        {
+            "page_slugs": ["missing_page"],
+            "text": "Nothing to find here.",
+        },
+        {
+            "page_slugs": [],
+            "text": "In interdum ullamcorper dolor et vulputate. Nulla facilisi.",
+        },
+        {
+            "page_slugs": [],
+            "all_pages": True,
+            "text": "In interdum ullamcorper dolor et vulputate. Nulla facilisi.",
+        },
+    ]
+    response = await client.post("/retrieve/chunks/batch", json={"queries": queries})
+    assert response.status_code == 200, response.text
+
+    results = response.json()["results"]
+    assert len(results) == 5
+    assert results[0]["matches"][0]["chunk"] == "test_chunk_3"
+    assert results[1]["matches"][0]["chunk"] == "test_chunk_2"
+    assert results[2]["matches"] == []
+    # No pages match nothing, unless every page is searched explicitly
+    assert results[3]["matches"] == []
+    assert results[4]["matches"][0]["chunk"] == "test_chunk_2"
+
+
+async def test_embedding_cache(client):
+    query = {
+        "page_slugs": ["test_page"],
+        "text": "Repeated   query text for the embedding cache.",
+    }
+    before = (await client.post("/stats/embedding_cache")).json()
+    await client.post("/retrieve/chunks", json=query)
+    query["text"] = "Repeated query text for the embedding cache."
+    await client.post("/retrieve/chunks", json=query)
+    after = (await client.post("/stats/embedding_cache")).json()
+
+    # Whitespace is normalized, so the second query is a cache hit
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] <= before["misses"] + 1
+
+
+async def test_model_stats(client):
+    await client.post(
+        "/retrieve/chunks",
+        json={"page_slugs": ["test_page"], "text": "Load the embedding model."},
+    )
+    response = await client.post("/stats/models")
+    assert response.status_code == 200, response.text
+
+    models = {model["name"]: model for model in response.json()}
+    embedding_model = models["sentence-transformers/all-MiniLM-L6-v2"]
+    assert embedding_model["resident_bytes"] > 0
+
+
+async def test_benchmark_embedding(client):
+    response = await client.post("/benchmark/embedding")
+    assert response.status_code == 200, response.text
+
+    reports = {report["mode"]: report for report in response.json()}
+    assert reports["unbatched"]["mean_batch_size"] == 1.0
+    assert reports["batched"]["mean_batch_size"] > 1.0
+
+
+async def test_onnx_embedding_parity():
+    """The quantized ONNX Runtime backend agrees with PyTorch."""
+    texts = [
+        "Short text.",
+        "Aenean fermentum, elit eget tincidunt condimentum, eros ipsum rutrum orci.",
+        "In interdum ullamcorper dolor et vulputate. Nulla facilisi." * 8,
+    ]
+    expected = EmbeddingPipeline(backend="torch").forward(texts)
+    actual = EmbeddingPipeline(backend="onnx").forward(texts)
+
+    assert actual.shape == expected.shape
+    assert (actual * expected).sum(axis=1).min() >= 0.99
+
+
+async def test_benchmark_embedding_backends(client):
+    response = await client.post("/benchmark/embedding/backends")
+    assert response.status_code == 200, response.text
+
+    reports = {report["backend"]: report for report in response.json()}
+    assert set(reports) == {"torch", "onnx"}
+    assert all(report["min_cosine"] >= 0.99 for report in reports.values())
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.model_registry import ModelRegistry
+
+
+async def test_micro_batcher_sheds_load():
+    release = asyncio.Event()
+
+    async def echo(items):
+        await release.wait()
+        return items
+
+    batcher = MicroBatcher(echo, max_batch_size=1, max_wait=0, max_queue=2, name="test")
+    running = [asyncio.create_task(batcher.submit([0]))]
+    await asyncio.sleep(0.01)  # The first item is taken into a batch
+    running += [asyncio.create_task(batcher.submit([n])) for n in (1, 2)]
+    await asyncio.sleep(0.01)  # The next two wait in the queue
+
+    with pytest.raises(HTTPException) as error:
+        await batcher.submit([3])
+    assert error.value.status_code == 503
+
+    release.set()
+    assert await asyncio.gather(*running) == [[0], [1], [2]]
+    await batcher.close()
+
+
+async def test_model_registry():
+    registry = ModelRegistry()
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(timeout=5)
+        return "slow model"
+
+    # A model that is loading blocks neither the event loop nor other models
+    slow = asyncio.create_task(registry.aget("slow", slow_loader))
+    while not loading.is_set():
+        await asyncio.sleep(0.01)
+    assert registry.get("fast", lambda: "fast model") == "fast model"
+    release.set()
+    assert await slow == "slow model"
+    assert await registry.aget("slow", slow_loader) == "slow model"
+
+    with registry.override("slow", "stand-in"):
+        assert await registry.aget("slow", slow_loader) == "stand-in"
+    assert registry.get("slow", slow_loader) == "slow model"
+    assert {stats.name for stats in registry.report()} == {"slow", "fast"}
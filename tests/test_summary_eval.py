@@ -1,4 +1,18 @@
-from src.schemas.summary import SummaryResultsWithFeedback
+import asyncio
+
+import pytest
+
+from src.pipelines.keyphrases import KeyphraseMatcher, suggest_keyphrases
+from src.pipelines.nlp import nlp
+from src.pipelines.summary import LongformerPipeline
+from src.schemas.summary import (
+    ChunkWithWeight,
+    SummaryInputStrapi,
+    SummaryResultsWithFeedback,
+    SummaryScoreResults,
+)
+from src.services.summary_cache import CachedScore, SummaryScoreCache
+from src.services.summary_eval import summary_stages
 
 
 async def test_summary_eval(client):
@@ -18,3 +32,175 @@ async def test_summary_eval(client):
     if feedback.metrics.content.is_passed is False:
         print(feedback.metrics.content.model_dump_json())
         raise AssertionError("Content score should be passing.")
+
+    # Stages are timed, and the scoring stages overlap with the I/O stages
+    stages = dict(
+        stage.strip().split(";dur=")
+        for stage in response.headers["Server-Timing"].split(",")
+    )
+    assert {"page", "similarity", "volume_prior", "content"} <= stages.keys()
+
+
+async def test_relevance_stats(client):
+    response = await client.post("/stats/relevance")
+    assert response.status_code == 200, response.text
+
+    stats = response.json()
+    assert stats["backend"] in ("faiss", "supabase", "shadow")
+    assert stats["mean_abs_diff"] <= stats["max_abs_diff"]
+
+
+async def test_page_cache(client):
+    summary = {
+        "page_slug": "test-page",
+        "summary": "Tests catch bugs early and document how the code should behave.",
+    }
+    await client.post("/score/summary", json=summary)
+    before = (await client.post("/stats/page_cache")).json()
+
+    summary["summary"] = "Tests give developers confidence to change their code."
+    response = await client.post("/score/summary", json=summary)
+    assert response.status_code == 200, response.text
+
+    # The page was parsed by the first request
+    after = (await client.post("/stats/page_cache")).json()
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+async def test_benchmark_containment(client):
+    response = await client.post("/benchmark/containment")
+    assert response.status_code == 200, response.text
+
+    reports = response.json()
+    assert [report["page_tokens"] for report in reports] == [1000, 5000, 10000, 50000]
+    assert all(report["matches"] for report in reports)
+
+
+async def test_keyphrase_matcher():
+    chunks = [
+        ChunkWithWeight(
+            component_type="page.chunk",
+            slug=f"chunk-{n}",
+            header="Header",
+            clean_text="Text",
+            keyphrases=keyphrases,
+            weight=1.0,
+        )
+        for n, keyphrases in enumerate(
+            [["unit tests", "documentation"], ["modular architecture"]]
+        )
+    ]
+    summary = nlp("Unit testing catches bugs and a unit test serves as documentation.")
+
+    included, suggested = suggest_keyphrases(summary, chunks)
+    assert included == ["unit tests", "documentation"]
+    assert suggested == ["modular architecture"]
+
+    # The cached matcher gives the same results
+    matcher = KeyphraseMatcher(chunks)
+    assert suggest_keyphrases(summary, chunks, matcher) == (included, suggested)
+
+
+async def test_longformer_cached_source_parity():
+    """Scoring with cached source token ids matches the joined input string."""
+    pipeline = LongformerPipeline.shared("tiedaar/longformer-content-global2")
+    summary = "Tests catch bugs early and document how code should behave."
+    source = "Writing tests is essential in software development. " * 20
+
+    joined = pipeline.preprocess(
+        summary + "</s>" + source, **pipeline._preprocess_params
+    )
+    cached = pipeline.preprocess((summary, source), **pipeline._preprocess_params)
+    assert joined.keys() == cached.keys()
+    for key in joined:
+        assert joined[key].tolist() == cached[key].tolist()
+
+    expected = pipeline(summary + "</s>" + source)[0]["score"]
+    assert pipeline.score(summary, source) == pytest.approx(expected, abs=1e-6)
+
+
+async def test_benchmark_summary(client):
+    response = await client.post("/benchmark/summary")
+    assert response.status_code == 200, response.text
+
+    reports = {report["concurrency"]: report for report in response.json()}
+    assert reports[1]["mean_batch_size"] == 1.0
+    assert reports[16]["mean_batch_size"] > 1.0
+
+
+async def test_junk_summary_skips_stages(client):
+    before = {
+        stage["name"]: stage
+        for stage in (await client.post("/stats/summary_stages")).json()
+    }
+    response = await client.post(
+        "/score/summary",
+        json={
+            "page_slug": "test-page",
+            "summary": "Escribir pruebas es esencial en el desarrollo de software. Detectan errores temprano y sirven como documentación confiable.",  # noqa: E501
+        },
+    )
+    assert response.status_code == 200, response.text
+
+    # Every metric but content is scored
+    feedback = SummaryResultsWithFeedback.model_validate(response.json())
+    assert feedback.is_passed is False
+    assert feedback.metrics.english.is_passed is False
+    assert feedback.metrics.containment.score is not None
+    assert feedback.metrics.profanity.score is not None
+    assert feedback.metrics.similarity.score is not None
+    assert feedback.metrics.content.score is None
+
+    after = {
+        stage["name"]: stage
+        for stage in (await client.post("/stats/summary_stages")).json()
+    }
+    for name in ["volume_prior", "content"]:
+        assert after[name]["skips"] == before[name]["skips"] + 1
+    for name in ["english", "similarity", "keyphrases"]:
+        assert after[name]["runs"] == before[name]["runs"] + 1
+
+
+async def test_summary_stage_order():
+    """Every returned score is computed before the junk filter is checked,
+    and only the volume prior and content can be skipped."""
+    costs = {stage.name: stage.cost for stage in summary_stages.stats()}
+    checks = ["english", "profanity", "containment", "similarity", "keyphrases"]
+    assert len({costs[name] for name in checks}) == 1
+    assert costs["volume_prior"] == costs["content"] > costs["english"]
+
+
+async def test_summary_score_cache():
+    cache = SummaryScoreCache(maxsize=8, ttl=60)
+    summary_input = SummaryInputStrapi(
+        page_slug="test-page", summary="Tests  catch bugs."
+    )
+    resubmitted = SummaryInputStrapi(
+        page_slug="test-page", summary=" Tests catch bugs. "
+    )
+    key = cache.key(summary_input, "test-page@2024-01-01T00:00:00")
+
+    # Whitespace is normalized, and a new page revision is a different key
+    assert cache.key(resubmitted, "test-page@2024-01-01T00:00:00") == key
+    assert cache.key(resubmitted, "test-page@2024-02-01T00:00:00") != key
+
+    # An identical request waits for the first one to be scored
+    assert await cache.get(key) is None
+    waiting = asyncio.create_task(cache.get(key))
+    await asyncio.sleep(0)
+    score = CachedScore(
+        SummaryScoreResults(
+            containment=0.0,
+            similarity=0.5,
+            english=True,
+            profanity=False,
+            included_keyphrases=[],
+            suggested_keyphrases=[],
+        ),
+        None,
+    )
+    cache.put(key, score)
+    assert await waiting is score
+    assert await cache.get(key) is score
+    assert (cache.hits, cache.misses) == (2, 1)